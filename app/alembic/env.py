@@ -5,7 +5,6 @@ from sqlalchemy import pool
 
 from alembic import context
 from app.settings import SQLALCHEMY_DATABASE_URL
-from app.database import metadata
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -15,9 +14,6 @@ fileConfig(config.config_file_name)
 # DB Connection configuration
 config.set_main_option('sqlalchemy.url', SQLALCHEMY_DATABASE_URL)
 
-# add your model's MetaData object here
-target_metadata = metadata
-
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
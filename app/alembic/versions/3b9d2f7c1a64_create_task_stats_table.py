@@ -0,0 +1,43 @@
+"""Create task stats table
+
+Revision ID: 3b9d2f7c1a64
+Revises: 851a3fa2e65a
+Create Date: 2026-10-18 14:26:41.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.entities.base_entity import TaskStatus, TaskPriority
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d2f7c1a64'
+down_revision: Union[str, None] = '851a3fa2e65a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'task_stats',
+        sa.Column('user_id', sa.UUID, primary_key=True, nullable=False),
+        # Reuse the enum types created with the tasks table
+        sa.Column('status', postgresql.ENUM(TaskStatus, name='taskstatus', create_type=False), primary_key=True, nullable=False),
+        sa.Column('priority', postgresql.ENUM(TaskPriority, name='taskpriority', create_type=False), primary_key=True, nullable=False),
+        sa.Column('task_count', sa.Integer, nullable=False, server_default='0'),
+    )
+    op.create_foreign_key('fk_tst_usr', 'task_stats', 'users', ['user_id'], ['id'])
+    op.execute(
+        "INSERT INTO task_stats (user_id, status, priority, task_count) "
+        "SELECT user_id, status, priority, count(*) FROM tasks "
+        "WHERE user_id IS NOT NULL "
+        "GROUP BY user_id, status, priority"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_tst_usr', 'task_stats', type_='foreignkey')
+    op.drop_table('task_stats')
@@ -0,0 +1,30 @@
+"""Add unique constraints on company name and user email/username
+
+Revision ID: 6e1c84a9d2f3
+Revises: 3b9d2f7c1a64
+Create Date: 2026-10-18 15:40:09.118264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1c84a9d2f3'
+down_revision: Union[str, None] = '3b9d2f7c1a64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if duplicates already exist; they have to be resolved by hand first
+    op.create_unique_constraint('uq_company_name', 'companies', ['name'])
+    op.create_unique_constraint('uq_user_email', 'users', ['email'])
+    op.create_unique_constraint('uq_user_username', 'users', ['username'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_user_username', 'users', type_='unique')
+    op.drop_constraint('uq_user_email', 'users', type_='unique')
+    op.drop_constraint('uq_company_name', 'companies', type_='unique')
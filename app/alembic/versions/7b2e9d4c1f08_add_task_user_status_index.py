@@ -0,0 +1,26 @@
+"""Add task user status index
+
+Revision ID: 7b2e9d4c1f08
+Revises: d3f6a8b0c417
+Create Date: 2026-10-18 21:07:33.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e9d4c1f08'
+down_revision: Union[str, None] = 'd3f6a8b0c417'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A user's tasks in one status (e.g. IN_PROGRESS), by id for offset and cursor pages alike
+    op.create_index('idx_tsk_usr_sts', 'tasks', ['user_id', 'status', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_tsk_usr_sts', table_name='tasks')
@@ -0,0 +1,38 @@
+"""Create user task counter table
+
+Revision ID: 851a3fa2e65a
+Revises: f52d463ef25f
+Create Date: 2026-10-18 11:02:17.583920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '851a3fa2e65a'
+down_revision: Union[str, None] = 'f52d463ef25f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_task_counters',
+        sa.Column('user_id', sa.UUID, primary_key=True, nullable=False),
+        sa.Column('in_progress_count', sa.Integer, nullable=False, server_default='0'),
+    )
+    op.create_foreign_key('fk_utc_usr', 'user_task_counters', 'users', ['user_id'], ['id'])
+    op.execute(
+        "INSERT INTO user_task_counters (user_id, in_progress_count) "
+        "SELECT user_id, count(*) FROM tasks "
+        "WHERE status = 'IN_PROGRESS' AND user_id IS NOT NULL "
+        "GROUP BY user_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_utc_usr', 'user_task_counters', type_='foreignkey')
+    op.drop_table('user_task_counters')
@@ -0,0 +1,48 @@
+"""Add task change notify trigger
+
+Revision ID: 9a47c3e1f5b2
+Revises: 6e1c84a9d2f3
+Create Date: 2026-10-18 16:05:27.581930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a47c3e1f5b2'
+down_revision: Union[str, None] = '6e1c84a9d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# NOTIFY is delivered on commit, so listeners never see rolled back changes.
+# The payload stays far below the 8000 byte limit: ids and enum labels only.
+def upgrade() -> None:
+    op.execute("""
+        CREATE FUNCTION notify_task_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('task_changes', json_build_object(
+                'op', lower(TG_OP),
+                'id', NEW.id,
+                'user_id', NEW.user_id,
+                'old_user_id', CASE WHEN TG_OP = 'UPDATE' THEN OLD.user_id END,
+                'status', NEW.status,
+                'priority', NEW.priority,
+                'updated_at', NEW.updated_at
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_tsk_notify_change
+        AFTER INSERT OR UPDATE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION notify_task_change()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER trg_tsk_notify_change ON tasks")
+    op.execute("DROP FUNCTION notify_task_change()")
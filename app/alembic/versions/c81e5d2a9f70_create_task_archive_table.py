@@ -0,0 +1,63 @@
+"""Create task archive table
+
+Revision ID: c81e5d2a9f70
+Revises: 9a47c3e1f5b2
+Create Date: 2026-10-18 16:48:12.630417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.entities.base_entity import TaskStatus, TaskPriority
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81e5d2a9f70'
+down_revision: Union[str, None] = '9a47c3e1f5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TASK_COLUMNS = "id, summary, description, status, priority, user_id, created_at, updated_at"
+
+
+def upgrade() -> None:
+    # Completed tasks past the retention age, partitioned by the year they were last updated.
+    # The archive job creates the partition of a year before moving rows into it.
+    op.create_table(
+        'tasks_archive',
+        sa.Column('id', sa.UUID, nullable=False),
+        sa.Column('summary', sa.String(length=255), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        # Reuse the enum types created with the tasks table
+        sa.Column('status', postgresql.ENUM(TaskStatus, name='taskstatus', create_type=False), nullable=False),
+        sa.Column('priority', postgresql.ENUM(TaskPriority, name='taskpriority', create_type=False), nullable=False),
+        sa.Column('user_id', sa.UUID, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('updated_at', sa.DateTime, nullable=False),
+        # The partition key has to be part of the primary key
+        sa.PrimaryKeyConstraint('id', 'updated_at'),
+        postgresql_partition_by='RANGE (updated_at)',
+    )
+    op.create_foreign_key('fk_tsk_arc_usr', 'tasks_archive', 'users', ['user_id'], ['id'])
+    op.create_index('idx_tsk_arc_usr', 'tasks_archive', ['user_id'])
+    # Lets the archive job find the next batch without scanning the hot table
+    op.create_index('idx_tsk_completed_updated_at', 'tasks', ['updated_at'],
+                    postgresql_where=sa.text("status = 'COMPLETED'"))
+    op.execute(
+        f"CREATE VIEW tasks_with_archive AS "
+        f"SELECT {TASK_COLUMNS} FROM tasks UNION ALL SELECT {TASK_COLUMNS} FROM tasks_archive"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP VIEW tasks_with_archive")
+    op.drop_index('idx_tsk_completed_updated_at', table_name='tasks')
+    # Move archived tasks back so downgrading loses nothing
+    op.execute(f"INSERT INTO tasks ({TASK_COLUMNS}) SELECT {TASK_COLUMNS} FROM tasks_archive")
+    op.drop_index('idx_tsk_arc_usr', table_name='tasks_archive')
+    op.drop_constraint('fk_tsk_arc_usr', 'tasks_archive', type_='foreignkey')
+    # Dropping a partitioned table drops its partitions
+    op.drop_table('tasks_archive')
@@ -0,0 +1,33 @@
+"""Add search indexes
+
+Revision ID: d3f6a8b0c417
+Revises: c81e5d2a9f70
+Create Date: 2026-10-18 17:21:54.093812
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f6a8b0c417'
+down_revision: Union[str, None] = 'c81e5d2a9f70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Trailing id columns match the keyset (sort column, id) order of cursor pages.
+# Further indexes are recommended per data set by benchmarks.index_advisor.
+def upgrade() -> None:
+    # A user's tasks, newest or oldest first; also serves the user_id foreign key
+    op.create_index('idx_tsk_usr_created_at', 'tasks', ['user_id', 'created_at', 'id'])
+    op.create_index('idx_tsk_created_at', 'tasks', ['created_at', 'id'])
+    # Company filter on user search, company task stats and the company_id foreign key
+    op.create_index('idx_usr_cmp', 'users', ['company_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_usr_cmp', table_name='users')
+    op.drop_index('idx_tsk_created_at', table_name='tasks')
+    op.drop_index('idx_tsk_usr_created_at', table_name='tasks')
@@ -0,0 +1,37 @@
+"""Alter task archive description
+
+Revision ID: e2a4c6b8d0f1
+Revises: 7b2e9d4c1f08
+Create Date: 2026-10-18 21:42:08.771930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a4c6b8d0f1'
+down_revision: Union[str, None] = '7b2e9d4c1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TASK_COLUMNS = "id, summary, description, status, priority, user_id, created_at, updated_at"
+
+
+# Databases that ran c81e5d2a9f70 before it matched the entities have a text column; a no-op otherwise
+def upgrade() -> None:
+    # A view column's type cannot change under it
+    op.execute("DROP VIEW tasks_with_archive")
+    op.alter_column('tasks_archive', 'description', type_=sa.String(length=255), existing_nullable=True)
+    op.execute(
+        f"CREATE VIEW tasks_with_archive AS "
+        f"SELECT {TASK_COLUMNS} FROM tasks UNION ALL SELECT {TASK_COLUMNS} FROM tasks_archive"
+    )
+
+
+def downgrade() -> None:
+    # c81e5d2a9f70 creates the column as String(255) as well, so there is nothing to restore
+    pass
@@ -0,0 +1,46 @@
+"""Add trigram search indexes
+
+Revision ID: f52d463ef25f
+Revises: a0c66e49684c
+Create Date: 2026-10-18 09:12:41.204113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f52d463ef25f'
+down_revision: Union[str, None] = 'a0c66e49684c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_INDEXES = [
+    ("idx_tsk_smr_trgm", "tasks", "summary"),
+    ("idx_tsk_desc_trgm", "tasks", "description"),
+    ("idx_cmp_name_trgm", "companies", "name"),
+    ("idx_cmp_desc_trgm", "companies", "description"),
+    ("idx_usr_email_trgm", "users", "email"),
+    ("idx_usr_username_trgm", "users", "username"),
+    ("idx_usr_fst_name_trgm", "users", "first_name"),
+    ("idx_usr_lst_name_trgm", "users", "last_name"),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, table_name, column_name in TRIGRAM_INDEXES:
+        op.create_index(
+            index_name,
+            table_name,
+            [column_name],
+            postgresql_using="gin",
+            postgresql_ops={column_name: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    for index_name, table_name, _ in TRIGRAM_INDEXES:
+        op.drop_index(index_name, table_name=table_name)
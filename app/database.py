@@ -1,9 +1,19 @@
-from sqlalchemy import create_engine, MetaData
+import itertools
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import create_engine, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from app.settings import SQLALCHEMY_DATABASE_URL, SQLALCHEMY_DATABASE_URL_ASYNC
+from app.settings import (
+    SQLALCHEMY_DATABASE_URL, SQLALCHEMY_DATABASE_URL_ASYNC,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE,
+    DB_REPLICA_URLS, DB_REPLICA_RETRY_SECONDS,
+)
 
 
 def get_db_context():
@@ -13,16 +23,193 @@ def get_db_context():
     finally:
         db.close()
 
-async def get_async_db_context():
-    async with AsyncSessionLocal() as async_db:
-        yield async_db
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-async_engine = create_async_engine(SQLALCHEMY_DATABASE_URL_ASYNC)
+class PoolTelemetry:
+    """Connection checkout wait times for one engine's pool."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+def timed_pool_class(base: type) -> type:
+    """Subclass a queue pool so every checkout records its wait time.
+
+    Each engine gets its own subclass, so the telemetry survives pool.recreate().
+    """
+    telemetry = PoolTelemetry()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except exc.TimeoutError:
+            telemetry.record_wait(time.perf_counter() - started_at, timed_out=True)
+            raise
+        telemetry.record_wait(time.perf_counter() - started_at)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "telemetry": telemetry})
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+def get_pool_stats() -> dict:
+    engines = {"engine": engine, "async_engine": async_engine}
+    engines.update({f"replica_{index}": replica for index, replica in enumerate(replicas.engines)})
+    return {name: value.pool.telemetry.snapshot(value.pool) for name, value in engines.items() if value is not None}
+
+# Called with the (sync) engine of every engine created below, e.g. to add event listeners
+engine_hooks: list[Callable] = []
+
+def _run_engine_hooks(sync_engine) -> None:
+    for hook in engine_hooks:
+        hook(sync_engine)
+
+# Engines are created on demand (the app lifespan, scripts), never at import time.
+# The session factories are configured in place, so importers keep a valid reference.
+engine = None
+async_engine = None
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Write paths return RETURNING-loaded entities after commit; expiring them would force a reload
+AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+
+def init_engine():
+    global engine
+    if engine is None:
+        engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=timed_pool_class(QueuePool), **_pool_options())
+        _run_engine_hooks(engine)
+        SessionLocal.configure(bind=engine)
+    return engine
+
+def init_async_engine():
+    global async_engine
+    if async_engine is None:
+        async_engine = create_async_engine(
+            SQLALCHEMY_DATABASE_URL_ASYNC,
+            poolclass=timed_pool_class(AsyncAdaptedQueuePool),
+            connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+            **_pool_options(),
+        )
+        _run_engine_hooks(async_engine.sync_engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+
+
+class ReplicaSet:
+    """Round-robin routing of read sessions over the replicas, with failover to the primary.
+
+    A replica that fails to hand out a connection is skipped for
+    ``retry_after`` seconds.
+    """
+
+    def __init__(self, urls: list[str], retry_after: float) -> None:
+        self.urls = urls
+        self.retry_after = retry_after
+        self.engines = []
+        self._sessionmakers = []
+        self._down_until = [0.0] * len(urls)
+        self._next = itertools.count()
+        self.reads = {"replica": 0, "primary": 0, "failover": 0}
+
+    def init(self) -> None:
+        if self.engines or not self.urls:
+            return
+        for url in self.urls:
+            replica = create_async_engine(
+                url,
+                poolclass=timed_pool_class(AsyncAdaptedQueuePool),
+                connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+                # A pooled connection to a replica that went away must fail over, not fail the request
+                **{**_pool_options(), "pool_pre_ping": True},
+            )
+            _run_engine_hooks(replica.sync_engine)
+            self.engines.append(replica)
+            self._sessionmakers.append(async_sessionmaker(replica, autocommit=False, autoflush=False, expire_on_commit=False))
+
+    async def dispose(self) -> None:
+        for replica in self.engines:
+            await replica.dispose()
+        self.engines = []
+        self._sessionmakers = []
+
+    def _healthy(self) -> list[int]:
+        now = time.monotonic()
+        start = next(self._next)
+        order = [(start + offset) % len(self.engines) for offset in range(len(self.engines))]
+        return [index for index in order if self._down_until[index] <= now]
+
+    async def read_session(self, primary: bool = False):
+        """A replica session, or a primary one when ``primary`` is set or no replica is healthy."""
+        if not self.engines or primary:
+            self.reads["primary"] += 1
+            return AsyncSessionLocal()
+        for index in self._healthy():
+            session = self._sessionmakers[index]()
+            try:
+                # Check the connection out now, so an unreachable replica is detected before the endpoint runs
+                await session.connection()
+            except (exc.DBAPIError, exc.TimeoutError, OSError):
+                await session.close()
+                self._down_until[index] = time.monotonic() + self.retry_after
+                continue
+            self.reads["replica"] += 1
+            return session
+        self.reads["failover"] += 1
+        return AsyncSessionLocal()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": len(self.engines),
+            "healthy": sum(1 for down_until in self._down_until[:len(self.engines)] if down_until <= now),
+            "reads": dict(self.reads),
+        }
 
-metadata = MetaData().create_all(engine)
+replicas = ReplicaSet(DB_REPLICA_URLS, DB_REPLICA_RETRY_SECONDS)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False)
+async def dispose_engines() -> None:
+    global engine, async_engine
+    await replicas.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+    if engine is not None:
+        engine.dispose()
+        engine = None
 
 Base = declarative_base()
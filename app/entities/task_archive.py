@@ -0,0 +1,37 @@
+from app.database import Base
+from sqlalchemy import Column, DateTime, String, Enum, ForeignKey, Uuid
+from app.entities.base_entity import TaskStatus, TaskPriority
+
+
+class TaskArchive(Base):
+    """Completed tasks moved out of ``tasks`` by the archive job; partitioned by updated_at."""
+    __tablename__ = "tasks_archive"
+
+    id= Column(Uuid, primary_key=True)
+    summary= Column(String(255), nullable=False)
+    description= Column(String(255), nullable=True)
+    status= Column(Enum(TaskStatus), nullable=False)
+    priority= Column(Enum(TaskPriority), nullable=False)
+    user_id= Column(Uuid, ForeignKey('users.id'), nullable=True)
+    created_at= Column(DateTime, nullable=False)
+    updated_at= Column(DateTime, primary_key=True)
+
+
+class TaskWithArchive(Base):
+    """Read-only mapping of the ``tasks_with_archive`` view: live and archived tasks."""
+    __tablename__ = "tasks_with_archive"
+    __table_args__ = {"info": {"is_view": True}}
+
+    id= Column(Uuid, primary_key=True)
+    summary= Column(String(255), nullable=False)
+    description= Column(String(255), nullable=True)
+    status= Column(Enum(TaskStatus), nullable=False)
+    priority= Column(Enum(TaskPriority), nullable=False)
+    user_id= Column(Uuid, nullable=True)
+    created_at= Column(DateTime)
+    updated_at= Column(DateTime)
+
+
+    @classmethod
+    def get_sortable_fields(cls):
+        return frozenset(cls.__table__.columns.keys()) - {'id'}
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Enum, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+from app.entities.base_entity import TaskStatus, TaskPriority
+
+
+class TaskStat(Base):
+    __tablename__ = "task_stats"
+
+    user_id= Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+    status= Column(Enum(TaskStatus), primary_key=True)
+    priority= Column(Enum(TaskPriority), primary_key=True)
+    task_count= Column(Integer, nullable=False, default=0)
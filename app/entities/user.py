@@ -1,4 +1,4 @@
-from passlib.context import CryptContext
+from functools import lru_cache
 
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy.sql.sqltypes import String, Boolean
@@ -8,8 +8,6 @@ from app.database import Base
 from app.entities.base_entity import BaseEntity
 
 
-bcrypt_context = CryptContext(schemes=["bcrypt"])
-
 class User(BaseEntity, Base):
     __tablename__ = "users"
 
@@ -29,8 +27,14 @@ class User(BaseEntity, Base):
     def get_sortable_fields(cls):
         return frozenset(cls.__table__.columns.keys()) - {'id'}
 
+@lru_cache(maxsize=None)
+def bcrypt_context():
+    # passlib and bcrypt are only needed on login and user writes, not to boot the app
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"])
+
 def get_password_hash(password):
-    return bcrypt_context.hash(password)
+    return bcrypt_context().hash(password)
 
 def verify_password(plain_password, hased_password):
-    return bcrypt_context.verify(plain_password, hased_password)
+    return bcrypt_context().verify(plain_password, hased_password)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class UserTaskCounter(Base):
+    __tablename__ = "user_task_counters"
+
+    user_id= Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+    in_progress_count= Column(Integer, nullable=False, default=0)
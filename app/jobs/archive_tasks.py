@@ -0,0 +1,31 @@
+""" Move completed tasks past the retention age to the archive table
+
+Usage (from the repository root):
+
+    python -m app.jobs.archive_tasks [--after-days 90] [--batch-size 1000] [--max-batches 0]
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, init_async_engine, dispose_engines
+from app.entities import company, user  # noqa: F401  (register mappers referenced by Task)
+from app.services.task_archive import archive_tasks
+from app.settings import TASK_ARCHIVE_AFTER_DAYS, TASK_ARCHIVE_BATCH_SIZE
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive completed tasks")
+    parser.add_argument("--after-days", type=int, default=TASK_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=TASK_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=0, help="stop after this many batches (0: until done)")
+    args = parser.parse_args()
+
+    init_async_engine()
+    async with AsyncSessionLocal() as db:
+        moved = await archive_tasks(db, args.after_days, args.batch_size, args.max_batches)
+    await dispose_engines()
+    print(f"Archived {moved} tasks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
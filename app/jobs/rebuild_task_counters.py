@@ -0,0 +1,23 @@
+""" Rebuild the per-user IN_PROGRESS task counters from the tasks table
+
+Usage (from the repository root):
+
+    python -m app.jobs.rebuild_task_counters
+"""
+import asyncio
+
+from app.database import AsyncSessionLocal, init_async_engine, dispose_engines
+from app.entities import company, user  # noqa: F401  (register mappers referenced by Task)
+from app.services.task_counter import rebuild_task_counters
+
+
+async def main() -> None:
+    init_async_engine()
+    async with AsyncSessionLocal() as db:
+        users = await rebuild_task_counters(db)
+    await dispose_engines()
+    print(f"Rebuilt task counters for {users} users with in progress tasks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+""" Rebuild the per-user task stats from the tasks table
+
+Usage (from the repository root):
+
+    python -m app.jobs.rebuild_task_stats
+"""
+import asyncio
+
+from app.database import AsyncSessionLocal, init_async_engine, dispose_engines
+from app.entities import company, task, user  # noqa: F401  (register the Task mapper and the ones it references)
+from app.services.task_stats import rebuild_task_stats
+
+
+async def main() -> None:
+    init_async_engine()
+    async with AsyncSessionLocal() as db:
+        groups = await rebuild_task_stats(db)
+    await dispose_engines()
+    print(f"Rebuilt {groups} task stats groups")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,67 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routers import company, auth, user, task
-app = FastAPI()
+from app.database import engine_hooks, get_pool_stats, init_async_engine, dispose_engines, replicas
+from app.services.entity_cache import entity_cache
+from app.services.metrics import MetricsMiddleware, instrument_engine
+from app.services.profiling import ProfilingMiddleware
+from app.services.password import password_hash_pool
+from app.services.search import search_statements
+from app.services.search_cache import search_cache
+from app.services.task_feed import task_feed
+from app.routers import company, auth, user, task, metrics
+from app.settings import PROFILING_ENABLED
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creating the engine loads the DB driver but opens no connection; the pool fills on demand
+    init_async_engine()
+    replicas.init()
+    yield
+    await task_feed.stop()
+    await dispose_engines()
+    password_hash_pool.shutdown()
+
+# Count and time the SQL of every engine the app creates, replicas included
+engine_hooks.append(instrument_engine)
+
+app = FastAPI(lifespan=lifespan)
+if PROFILING_ENABLED:
+    # Inside MetricsMiddleware, so the profiler sees the request's SQL statements
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(company.router)
 app.include_router(auth.router)
 app.include_router(user.router)
 app.include_router(task.router)
+app.include_router(metrics.router)
 
 @app.get("/", tags=["Health Check"])
 
 def read_root():
     return {"message": "App is running"}
+
+@app.get("/health/db-pool", tags=["Health Check"])
+def read_db_pool():
+    return get_pool_stats()
+
+@app.get("/health/db-replicas", tags=["Health Check"])
+def read_db_replicas():
+    return replicas.stats()
+
+@app.get("/health/entity-cache", tags=["Health Check"])
+def read_entity_cache():
+    return entity_cache.stats()
+
+@app.get("/health/search-statements", tags=["Health Check"])
+def read_search_statements():
+    return search_statements.stats()
+
+@app.get("/health/search-cache", tags=["Health Check"])
+def read_search_cache():
+    return search_cache.stats()
+
+@app.get("/health/task-feed", tags=["Health Check"])
+def read_task_feed():
+    return task_feed.stats()
@@ -0,0 +1,8 @@
+from typing import Optional
+from uuid import UUID
+from pydantic import BaseModel
+
+class BulkItemResultModel(BaseModel):
+    index: int
+    id: Optional[UUID] = None
+    error: Optional[str] = None
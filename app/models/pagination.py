@@ -0,0 +1,11 @@
+from typing import Generic, Optional, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class SearchPageModel(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_is_estimate: Optional[bool] = None
+    facets: Optional[dict[str, dict[str, int]]] = None
@@ -24,6 +24,28 @@ class TaskModel(BaseModel):
             }
         }
 
+class TaskResponseModel(BaseModel):
+    id: UUID
+    summary: str
+    description: Optional[str] = None
+    status: TaskStatus
+    priority: TaskPriority
+    user_id: Optional[UUID] = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+class TaskStatsGroupModel(BaseModel):
+    status: TaskStatus
+    priority: TaskPriority
+    count: int
+
+class TaskStatsModel(BaseModel):
+    total: int
+    groups: list[TaskStatsGroupModel]
+
 class TaskSearchModel():
     def __init__(self,
                 summary: Optional[str] = None,
@@ -34,7 +56,14 @@ class TaskSearchModel():
                 order_by: Optional[str] = None,
                 order_direction: Optional[str] = None,
                 page: Optional[int] = None,
-                page_size: Optional[int] = None):
+                page_size: Optional[int] = None,
+                cursor: Optional[str] = None,
+                search_mode: Optional[str] = None,
+                rank: Optional[bool] = None,
+                include_total: Optional[bool] = None,
+                count_mode: Optional[str] = None,
+                include_facets: Optional[bool] = None,
+                include_archived: Optional[bool] = None):
         self.summary = summary
         self.description = description
         self.status = status
@@ -44,6 +73,13 @@ class TaskSearchModel():
         self.order_direction = order_direction
         self.page = page
         self.page_size = page_size
+        self.cursor = cursor
+        self.search_mode = search_mode
+        self.rank = rank
+        self.include_total = include_total
+        self.count_mode = count_mode
+        self.include_facets = include_facets
+        self.include_archived = include_archived
 
     class Config:
         from_attributes = True
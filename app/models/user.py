@@ -92,7 +92,13 @@ class UserSearchModel():
                  order_by: Optional[str] = None,
                  order_direction: Optional[str] = None,
                  page: Optional[int] = None,
-                 page_size: Optional[int] = None):
+                 page_size: Optional[int] = None,
+                 cursor: Optional[str] = None,
+                 search_mode: Optional[str] = None,
+                 rank: Optional[bool] = None,
+                 include_total: Optional[bool] = None,
+                 count_mode: Optional[str] = None,
+                 include_facets: Optional[bool] = None):
         self.email = email
         self.username = username
         self.first_name = first_name
@@ -104,6 +110,12 @@ class UserSearchModel():
         self.order_direction = order_direction
         self.page = page
         self.page_size = page_size
+        self.cursor = cursor
+        self.search_mode = search_mode
+        self.rank = rank
+        self.include_total = include_total
+        self.count_mode = count_mode
+        self.include_facets = include_facets
 
     class Config:
         from_attributes = True
@@ -1,23 +1,27 @@
 
 from datetime import timedelta
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from app.services import user as UserService
-from app.database import get_db_context
+from app.services.session import get_async_db_context
+from app.models.user import UserClaims
+from app.services.auth import authorizer
+from app.services.metrics import InstrumentedAPIRoute
+from app.services.password import password_hash_pool
 
-from app.services.exception import UnAuthorizedError
+from app.services.exception import UnAuthorizedError, AccessDeniedError
 from app.settings import JWT_ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = None
 
-router = APIRouter(prefix="/auth", tags=["Auth"])
+router = APIRouter(prefix="/auth", tags=["Auth"], route_class=InstrumentedAPIRoute)
 @router.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db_context)
+        db: AsyncSession = Depends(get_async_db_context)
         ):
-            user = UserService.authenticate_user(form_data.username, form_data.password, db)
+            user = await UserService.authenticate_user(form_data.username, form_data.password, db)
 
             if not user:
                 raise UnAuthorizedError()
@@ -29,3 +33,15 @@ async def login_for_access_token(
                     int(timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES).total_seconds())
             ),
         }
+
+@router.get("/hash-pool/metrics")
+async def get_hash_pool_metrics(user: UserClaims = Depends(authorizer)):
+    if not user.is_admin:
+        raise AccessDeniedError()
+    return password_hash_pool.metrics()
+
+@router.get("/token-cache/metrics")
+async def get_token_cache_metrics(user: UserClaims = Depends(authorizer)):
+    if not user.is_admin:
+        raise AccessDeniedError()
+    return authorizer.token_cache.stats()
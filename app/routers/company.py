@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db_context, get_async_db_context
+from app.services.session import get_read_db_context, get_write_db_context
 from app.models.company import CompanyModel, CompanyResponseModel, CompanySearchModel
 from app.models.user import UserClaims
+from app.models.task import TaskStatsModel
+from app.models.pagination import SearchPageModel
 from app.services import company as CompanyService
 from app.services.auth import authorizer
+from app.services.metrics import InstrumentedAPIRoute
 from app.services.company import validate_company_params
 from app.services.exception import AccessDeniedError
+from app.services.etag import ConditionalRequest, set_etag
+from app.services.serialization import serialize_response
 
 
 
@@ -18,23 +22,32 @@ from app.services.exception import AccessDeniedError
 router = APIRouter(
     prefix="/company",
     tags=["Company"],
+    route_class=InstrumentedAPIRoute,
 )
 
-@router.get("/")
-async def get_all_companies(db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+@router.get("/", response_model=list[CompanyResponseModel])
+async def get_all_companies(response: Response, export_format: Optional[str] = Query(default=None, alias="format", description="Stream the export instead of a JSON array (ndjson, csv)"),
+                            if_none_match: Optional[str] = Header(default=None),
+                            db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return CompanyService.get_all_companies(db)
+    if export_format:
+        return CompanyService.export_all_companies(export_format)
+    conditional = ConditionalRequest(if_none_match)
+    companies = await CompanyService.get_all_companies(db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(companies, CompanyResponseModel, response)
 
 @router.post("/", response_model=CompanyResponseModel)
-async def create_company(request: CompanyModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def create_company(request: CompanyModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return CompanyService.create_company(request, db)
+    return await CompanyService.create_company(request, db)
 
-@router.get("/search", response_model=list[CompanyResponseModel])
+@router.get("/search", response_model=list[CompanyResponseModel] | SearchPageModel[CompanyResponseModel])
 @validate_company_params
-async def search_companies(name: Optional[str] = Query(default=None),
+async def search_companies(response: Response,
+                           name: Optional[str] = Query(default=None),
                            description: Optional[str] = Query(default=None),
                            mode: Optional[str] = Query(default=None, description="Company mode (0: INACTIVE, 1: ACTIVE)"),
                            rating: Optional[str] = Query(default=None, description="Company rating (0: NOT_RATED, 1: ONE, 2: TWO, 3: THREE, 4: FOUR, 5: FIVE)"),
@@ -42,20 +55,40 @@ async def search_companies(name: Optional[str] = Query(default=None),
                            order_direction: Optional[str] = Query(default=None),
                            page: Optional[int] = Query(default=None),
                            page_size: Optional[int] = Query(default=None),
-                           db: AsyncSession = Depends(get_async_db_context), user: UserClaims = Depends(authorizer)):
+                           cursor: Optional[str] = Query(default=None, description="Opaque cursor from a previous next_cursor. Pass an empty value to start cursor paging"),
+                           search_mode: Optional[str] = Query(default=None, description="Text match mode (contains, prefix, similar)"),
+                           rank: Optional[bool] = Query(default=None, description="Order results by text relevance"),
+                           include_total: Optional[bool] = Query(default=None, description="Include the total number of matches"),
+                           count_mode: Optional[str] = Query(default=None, description="How to count the total (exact, estimate)"),
+                           include_facets: Optional[bool] = Query(default=None, description="Include per-value counts for the enum filters"),
+                           if_none_match: Optional[str] = Header(default=None),
+                           db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    request = CompanySearchModel(name, description, mode, rating, order_by, order_direction, page, page_size)
-    return await CompanyService.search_companies(request, db)
+    request = CompanySearchModel(name, description, mode, rating, order_by, order_direction, page, page_size, cursor, search_mode, rank, include_total, count_mode, include_facets)
+    conditional = ConditionalRequest(if_none_match)
+    result = await CompanyService.search_companies(request, db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(result, CompanyResponseModel, response)
 
 @router.get("/{company_id}", response_model=CompanyResponseModel)
-async def get_company(company_id: UUID, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def get_company(company_id: UUID, response: Response, if_none_match: Optional[str] = Header(default=None),
+                      db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin and user.company_id != str(company_id):
         raise AccessDeniedError()
-    return CompanyService.get_company(company_id, db)
+    conditional = ConditionalRequest(if_none_match)
+    company = await CompanyService.get_company(company_id, db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(company, CompanyResponseModel, response)
+
+@router.get("/{company_id}/task-stats", response_model=TaskStatsModel)
+async def get_company_task_stats(company_id: UUID, db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
+    if not user.is_admin and user.company_id != company_id:
+        raise AccessDeniedError()
+    return await CompanyService.get_company_task_stats(company_id, db)
 
 @router.put("/{company_id}", response_model=CompanyResponseModel)
-async def update_company(company_id: UUID, request: CompanyModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def update_company(company_id: UUID, request: CompanyModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return CompanyService.update_company(company_id, request, db)
+    return await CompanyService.update_company(company_id, request, db)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.database import get_pool_stats
+from app.services.auth import authorizer
+from app.services.entity_cache import entity_cache
+from app.services.metrics import render_gauges, render_histograms
+from app.services.password import password_hash_pool
+from app.services.search import search_statements
+from app.services.search_cache import search_cache
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    lines = render_histograms()
+
+    pool_stats = get_pool_stats()
+    for metric in ("checked_out", "overflow", "timeouts", "avg_wait_ms", "max_wait_ms"):
+        lines.extend(render_gauges(f"db_pool_{metric}", f"Connection pool {metric.replace('_', ' ')}",
+                                   {(("engine", name),): stats[metric] for name, stats in pool_stats.items()}))
+
+    hash_pool_stats = password_hash_pool.metrics()
+    for metric in ("in_flight", "queued", "completed", "rejected", "avg_wait_ms"):
+        lines.extend(render_gauges(f"password_hash_pool_{metric}", f"Password hash pool {metric.replace('_', ' ')}",
+                                   {(): hash_pool_stats[metric]}))
+
+    caches = (("token", authorizer.token_cache.stats()), ("entity", entity_cache.stats()),
+              ("search_statement", search_statements.stats()), ("search_result", search_cache.stats()))
+    for cache_name, stats in caches:
+        for metric in ("hits", "misses", "evictions", "hit_ratio"):
+            if stats.get(metric) is not None:
+                lines.extend(render_gauges(f"{cache_name}_cache_{metric}", f"{cache_name.replace('_', ' ').title()} cache {metric.replace('_', ' ')}",
+                                           {(): stats[metric]}))
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
@@ -1,36 +1,53 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from uuid import UUID
 
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db_context, get_async_db_context
+from app.services.session import get_read_db_context, get_write_db_context
 from app.services.auth import authorizer
+from app.services.metrics import InstrumentedAPIRoute
 from app.services.task import validate_task_params
 from app.services import task as TaskService
 from app.services.exception import AccessDeniedError
+from app.services.etag import ConditionalRequest, set_etag
+from app.services.serialization import serialize_response
 from app.models.user import UserClaims
-from app.models.task import TaskModel, TaskSearchModel
+from app.models.task import TaskModel, TaskResponseModel, TaskSearchModel, TaskStatsModel
+from app.models.pagination import SearchPageModel
+from app.models.bulk import BulkItemResultModel
 
 
 
 
-router = APIRouter(prefix="/task", tags=["Task"])
+router = APIRouter(prefix="/task", tags=["Task"], route_class=InstrumentedAPIRoute)
 
-@router.get("/")
-async def get_all_tasks(db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+@router.get("/", response_model=list[TaskResponseModel])
+async def get_all_tasks(response: Response, export_format: Optional[str] = Query(default=None, alias="format", description="Stream the export instead of a JSON array (ndjson, csv)"),
+                        if_none_match: Optional[str] = Header(default=None),
+                        db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return TaskService.get_all_tasks(db)
+    if export_format:
+        return TaskService.export_all_tasks(export_format)
+    conditional = ConditionalRequest(if_none_match)
+    tasks = await TaskService.get_all_tasks(db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(tasks, TaskResponseModel, response)
 
-@router.post("/")
-async def create_task(request: TaskModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
-    return TaskService.create_task(request, db, user)
+@router.post("/", response_model=TaskResponseModel)
+async def create_task(request: TaskModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
+    return await TaskService.create_task(request, db, user)
 
-@router.get("/search")
+@router.post("/bulk", response_model=list[BulkItemResultModel])
+async def create_tasks_bulk(request: list[TaskModel], db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
+    return await TaskService.create_tasks_bulk(request, db, user)
+
+@router.get("/search", response_model=list[TaskResponseModel] | SearchPageModel[TaskResponseModel])
 @validate_task_params
-async def search_tasks(summary: Optional[str] = Query(default=None),
+async def search_tasks(response: Response,
+                       summary: Optional[str] = Query(default=None),
                        description: Optional[str] = Query(default=None),
                        status: Optional[str] = Query(default=None, description="Task status (0: NOT_STARTED, 1: IN_PROGRESS, 2: COMPLETED)"),
                        priority: Optional[str] = Query(default=None, description="Task priority (0: LOW, 1: MEDIUM, 2: HIGH)"),
@@ -39,14 +56,40 @@ async def search_tasks(summary: Optional[str] = Query(default=None),
                        order_direction: Optional[str] = Query(default=None),
                        page: Optional[int] = Query(default=None),
                        page_size: Optional[int] = Query(default=None),
-                       db: AsyncSession = Depends(get_async_db_context), user: UserClaims = Depends(authorizer)):
-    request =  TaskSearchModel(summary, description, status, priority, user_id, order_by, order_direction, page, page_size)
-    return await TaskService.search_tasks(request, db, user)
+                       cursor: Optional[str] = Query(default=None, description="Opaque cursor from a previous next_cursor. Pass an empty value to start cursor paging"),
+                       search_mode: Optional[str] = Query(default=None, description="Text match mode (contains, prefix, similar)"),
+                       rank: Optional[bool] = Query(default=None, description="Order results by text relevance"),
+                       include_total: Optional[bool] = Query(default=None, description="Include the total number of matches"),
+                       count_mode: Optional[str] = Query(default=None, description="How to count the total (exact, estimate)"),
+                       include_facets: Optional[bool] = Query(default=None, description="Include per-value counts for the enum filters"),
+                       include_archived: Optional[bool] = Query(default=None, description="Also search completed tasks moved to the archive"),
+                       if_none_match: Optional[str] = Header(default=None),
+                       db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
+    request =  TaskSearchModel(summary, description, status, priority, user_id, order_by, order_direction, page, page_size, cursor, search_mode, rank, include_total, count_mode, include_facets, include_archived)
+    conditional = ConditionalRequest(if_none_match)
+    result = await TaskService.search_tasks(request, db, user, conditional)
+    set_etag(response, conditional)
+    return serialize_response(result, TaskResponseModel, response)
+
+@router.get("/stats", response_model=TaskStatsModel)
+async def get_task_stats(user_id: Optional[UUID] = Query(default=None, description="Only this user's tasks. Defaults to all tasks for admins and to your own tasks otherwise"),
+                         db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
+    return await TaskService.get_task_stats(db, user, user_id)
+
+@router.get("/stream", response_class=StreamingResponse,
+            description="Server-sent events for task creates and updates visible to the caller. Refetch tasks on a reset event; "
+                        "reconnect with a fresh token on an expired event")
+async def stream_task_changes(user: UserClaims = Depends(authorizer)):
+    return TaskService.stream_task_changes(user)
 
-@router.get("/{task_id}")
-async def get_task(task_id: UUID, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
-    return TaskService.get_task(task_id, db, user)
+@router.get("/{task_id}", response_model=TaskResponseModel)
+async def get_task(task_id: UUID, response: Response, if_none_match: Optional[str] = Header(default=None),
+                   db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
+    conditional = ConditionalRequest(if_none_match)
+    task = await TaskService.get_task(task_id, db, user, conditional)
+    set_etag(response, conditional)
+    return serialize_response(task, TaskResponseModel, response)
 
-@router.put("/{task_id}")
-async def update_task(task_id: UUID, request: TaskModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
-    return TaskService.update_task(task_id, request, db, user)
+@router.put("/{task_id}", response_model=TaskResponseModel)
+async def update_task(task_id: UUID, request: TaskModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
+    return await TaskService.update_task(task_id, request, db, user)
@@ -1,34 +1,54 @@
 from uuid import UUID
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db_context
+from app.services.session import get_read_db_context, get_write_db_context
 from app.services import user as UserService
 from app.services.auth import authorizer
+from app.services.metrics import InstrumentedAPIRoute
 from app.services.exception import AccessDeniedError
+from app.services.etag import ConditionalRequest, set_etag
+from app.services.serialization import serialize_response
 from app.models.user import UserClaims, UserResponseModel, UserUpdateModel, UserModel, UserSearchModel
+from app.models.pagination import SearchPageModel
+from app.models.bulk import BulkItemResultModel
 
 router = APIRouter(
     prefix="/user",
     tags=["User"],
+    route_class=InstrumentedAPIRoute,
 )
 
 @router.get("/", response_model=list[UserResponseModel])
-async def get_all_users(db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def get_all_users(response: Response, export_format: Optional[str] = Query(default=None, alias="format", description="Stream the export instead of a JSON array (ndjson, csv)"),
+                        if_none_match: Optional[str] = Header(default=None),
+                        db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return UserService.get_all_users(db)
+    if export_format:
+        return UserService.export_all_users(export_format)
+    conditional = ConditionalRequest(if_none_match)
+    users = await UserService.get_all_users(db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(users, UserResponseModel, response)
 
 @router.post("/", response_model=UserResponseModel)
-async def create_user(request: UserModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def create_user(request: UserModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin:
         raise AccessDeniedError()
-    return UserService.create_user(request, db)
+    return await UserService.create_user(request, db)
 
-@router.get("/search", response_model=list[UserResponseModel])
+@router.post("/bulk", response_model=list[BulkItemResultModel])
+async def create_users_bulk(request: list[UserModel], db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
+    if not user.is_admin:
+        raise AccessDeniedError()
+    return await UserService.create_users_bulk(request, db)
+
+@router.get("/search", response_model=list[UserResponseModel] | SearchPageModel[UserResponseModel])
 async def search_users(
+    response: Response,
     email: Optional[str] = Query(default=None),
     username: Optional[str] = Query(default=None),
     first_name: Optional[str] = Query(default=None),
@@ -40,22 +60,35 @@ async def search_users(
     order_direction: Optional[str] = Query(default=None),
     page: Optional[int] = Query(default=None),
     page_size: Optional[int] = Query(default=None),
-    db: Session = Depends(get_db_context),
+    cursor: Optional[str] = Query(default=None, description="Opaque cursor from a previous next_cursor. Pass an empty value to start cursor paging"),
+    search_mode: Optional[str] = Query(default=None, description="Text match mode (contains, prefix, similar)"),
+    rank: Optional[bool] = Query(default=None, description="Order results by text relevance"),
+    include_total: Optional[bool] = Query(default=None, description="Include the total number of matches"),
+    count_mode: Optional[str] = Query(default=None, description="How to count the total (exact, estimate)"),
+    if_none_match: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_read_db_context),
     user: UserClaims = Depends(authorizer)
 ):
     if not user.is_admin:
         raise AccessDeniedError()
-    request = UserSearchModel(email, username, first_name, last_name, company_id, is_admin, is_active, order_by, order_direction, page, page_size)
-    return UserService.search_users(request, db)
+    request = UserSearchModel(email, username, first_name, last_name, company_id, is_admin, is_active, order_by, order_direction, page, page_size, cursor, search_mode, rank, include_total, count_mode)
+    conditional = ConditionalRequest(if_none_match)
+    result = await UserService.search_users(request, db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(result, UserResponseModel, response)
 
 @router.put("/{user_id}", response_model=UserResponseModel)
-async def update_user(user_id: UUID, request: UserUpdateModel, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def update_user(user_id: UUID, request: UserUpdateModel, db: AsyncSession = Depends(get_write_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin and user.sub != str(user_id):
         raise AccessDeniedError()
-    return UserService.update_user(user_id, request, db, user)
+    return await UserService.update_user(user_id, request, db, user)
 
 @router.get("/{user_id}", response_model=UserResponseModel)
-async def get_user(user_id: UUID, db: Session = Depends(get_db_context), user: UserClaims = Depends(authorizer)):
+async def get_user(user_id: UUID, response: Response, if_none_match: Optional[str] = Header(default=None),
+                   db: AsyncSession = Depends(get_read_db_context), user: UserClaims = Depends(authorizer)):
     if not user.is_admin and user.sub != str(user_id):
         raise AccessDeniedError()
-    return UserService.get_user(user_id, db)
+    conditional = ConditionalRequest(if_none_match)
+    existing_user = await UserService.get_user(user_id, db, conditional)
+    set_etag(response, conditional)
+    return serialize_response(existing_user, UserResponseModel, response)
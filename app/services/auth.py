@@ -1,3 +1,4 @@
+import hashlib
 from enum import Enum
 from typing import Annotated
 from fastapi import Depends
@@ -5,20 +6,32 @@ from fastapi.security import OAuth2PasswordBearer
 import jwt
 
 from app.models.user import UserClaims
+from app.services.cache import LRUCache
 from app.services.exception import UnAuthorizedError
-from app.settings import JWT_SECRET, JWT_ALGORITHM
+from app.services.metrics import track_dependency
+from app.settings import JWT_SECRET, JWT_ALGORITHM, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
 
 
 class LocalAuthorizer:
     security_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, cache_size: int = TOKEN_CACHE_SIZE, cache_ttl: int = TOKEN_CACHE_TTL_SECONDS) -> None:
+        # Verified claims keyed by token hash; an entry never outlives the token's exp
+        self.token_cache = LRUCache(cache_size, ttl=cache_ttl)
 
     def __call__(self, token: Annotated[str, Depends(security_scheme)] = None):
+        with track_dependency("authorizer"):
+            return self.authorize(token)
+
+    def authorize(self, token: str) -> UserClaims:
         if not token:
             raise UnAuthorizedError()
 
+        token_hash = hashlib.sha256(token.encode()).digest()
+        cached_claims = self.token_cache.get(token_hash)
+        if cached_claims is not None:
+            return cached_claims
+
         try:
             claims = jwt.decode(
                 token,
@@ -30,7 +43,9 @@ class LocalAuthorizer:
                     "verify_exp": True,
                 }
             )
-            return UserClaims(**claims)
+            user_claims = UserClaims(**claims)
+            self.token_cache.set(token_hash, user_claims, expires_at=user_claims.exp)
+            return user_claims
 
         except jwt.PyJWTError as err:
             print(err)
@@ -1,75 +1,94 @@
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 from functools import wraps
 from uuid import UUID
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.company import CompanyModel, CompanySearchModel
+from fastapi.responses import StreamingResponse
+from app.models.company import CompanyModel, CompanyResponseModel, CompanySearchModel
 from app.services.utils import get_current_utc_time
+from app.services.export import stream_export
+from app.services.entity_cache import entity_cache
+from app.services.search_cache import search_cache, search_key, search_tags
+from app.services.search import execute_search
+from app.services.task_stats import read_company_task_stats
+from app.services.etag import ConditionalRequest, entity_etag, entity_version, query_etag, rows_etag
 from app.entities.company import Company
 from app.services.exception import BusinessRuleViolationError, ResourceNotFoundError, InvalidInputError
 from app.entities.base_entity import CompanyMode, Rating
 
-def create_company(data: CompanyModel, db: Session) -> Company:
-    existing_company = db.scalars(select(Company).filter(Company.name == data.name)).first()
-    if existing_company:
-        raise BusinessRuleViolationError("Company with this name already exists")
-    company = Company(**data.model_dump())
+async def create_company(data: CompanyModel, db: AsyncSession) -> Company:
     current_time = get_current_utc_time()
-    company.created_at = current_time
-    company.updated_at = current_time
-    db.add(company)
-    db.commit()
-    db.refresh(company)
+    values = {**data.model_dump(), "created_at": current_time, "updated_at": current_time}
+    try:
+        company = (await db.scalars(insert(Company).values(values).returning(Company))).one()
+        await db.commit()
+    except IntegrityError:
+        # uq_company_name is the only constraint a valid payload can violate
+        await db.rollback()
+        raise BusinessRuleViolationError("Company with this name already exists")
+    search_cache.invalidate(Company)
     return company
 
-def get_all_companies(db: Session) -> list[Company]:
-    return db.scalars(select(Company)).all()
+async def get_all_companies(db: AsyncSession, conditional: Optional[ConditionalRequest] = None) -> list[Company]:
+    query = select(Company)
+    if conditional and conditional.if_none_match:
+        conditional.check(await query_etag(db, query))
+    companies = (await db.scalars(query)).all()
+    if conditional:
+        conditional.etag = rows_etag(companies)
+    return companies
+
+def export_all_companies(export_format: str) -> StreamingResponse:
+    return stream_export(select(Company), list(CompanyResponseModel.model_fields), export_format, "companies")
+
+async def get_company(company_id: UUID, db: AsyncSession, conditional: Optional[ConditionalRequest] = None) -> Company:
+    if conditional and conditional.if_none_match:
+        version = await entity_version(db, Company, company_id)
+        if version:
+            conditional.check(entity_etag(version.id, version.updated_at))
 
-def get_company(company_id: UUID, db: Session) -> Company:
-    existing_company = db.scalars(select(Company).filter(Company.id == company_id)).first()
+    async def load():
+        return (await db.scalars(select(Company).filter(Company.id == company_id))).first()
+    existing_company = await entity_cache.get_or_load(Company, company_id, load)
     if not existing_company:
         raise ResourceNotFoundError()
+    if conditional:
+        conditional.etag = entity_etag(existing_company.id, existing_company.updated_at)
     return existing_company
 
-def update_company(company_id: UUID, data: CompanyModel, db: Session) -> Company:
-    existing_company_with_name = db.scalars(select(Company).filter(Company.name == data.name and Company.id != company_id)).first()
-    if existing_company_with_name:
+async def get_company_task_stats(company_id: UUID, db: AsyncSession) -> dict:
+    return await read_company_task_stats(db, company_id)
+
+async def update_company(company_id: UUID, data: CompanyModel, db: AsyncSession) -> Company:
+    values = {**data.model_dump(exclude_unset=True), "updated_at": get_current_utc_time()}
+    statement = (
+        update(Company).where(Company.id == company_id).values(values).returning(Company)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        existing_company = (await db.scalars(statement)).one_or_none()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
         raise BusinessRuleViolationError("Company with this name already exists")
-    existing_company = db.scalars(select(Company).filter(Company.id == company_id)).first()
     if not existing_company:
         raise ResourceNotFoundError()
-    data.updated_at = get_current_utc_time()
-    update_data_dict = data.model_dump(exclude_unset=True)
-    for field, value in update_data_dict.items():
-        setattr(existing_company, field, value)
-    db.commit()
-    db.refresh(existing_company)
+    await entity_cache.invalidate(Company, company_id)
+    search_cache.invalidate(Company)
     return existing_company
 
-async def search_companies(request: CompanySearchModel, db: AsyncSession) -> list[Company]:
-    query = select(Company)
-
-    conditions = [
-        Company.name.ilike(f"%{request.name}%") if request.name else None,
-        Company.description.ilike(f"%{request.description}%") if request.description else None,
-        Company.mode == request.mode if request.mode else None,
-        Company.rating == request.rating if request.rating else None,
-    ]
-
-    query = query.where(*[cond for cond in conditions if cond is not None])
-
-    if request.order_by:
-        if request.order_by and request.order_by in Company.get_sortable_fields():
-            order_column = getattr(Company, request.order_by)
-            query = query.order_by(order_column.desc() if request.order_direction == 'desc' else order_column)
-        else:
-            raise InvalidInputError("Invalid sort field")
+async def search_companies(request: CompanySearchModel, db: AsyncSession,
+                           conditional: Optional[ConditionalRequest] = None) -> list[Company] | dict:
+    text_filters = {"name": request.name, "description": request.description}
+    filters = {"mode": request.mode, "rating": request.rating}
 
-    if request.page and request.page_size:
-        query = query.offset((request.page - 1) * request.page_size).limit(request.page_size)
-    result = await db.scalars(query)
-    return result.all()
+    async def load(session: AsyncSession, conditional: ConditionalRequest):
+        return await execute_search(session, Company, request, text_filters, filters,
+                                    facet_columns={"mode": Company.mode, "rating": Company.rating}, conditional=conditional)
+    # Company search is admin-only
+    key = search_key(Company, "admin", request, text_filters, filters)
+    return await search_cache.get_or_load(db, Company, key, search_tags(Company, filters, ()), load, conditional)
 
 def validate_company_params(func: Callable[..., Any]) -> Callable[..., Any]:
     @wraps(func)
@@ -0,0 +1,191 @@
+""" Read-through cache for single-entity lookups
+
+Entities are cached as plain column dictionaries and rebuilt as transient
+instances on a hit, so cached values never hold on to a session. The backend
+is pluggable: ``memory`` is a per-process LRU, ``redis`` a shared store
+(requires the optional ``redis`` package), ``none`` disables caching.
+"""
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional, Protocol
+
+from app.services.cache import LRUCache
+from app.services.utils import dump_column_value, load_column_value
+from app.settings import (
+    ENTITY_CACHE_BACKEND, ENTITY_CACHE_URL, ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS,
+    DB_REPLICA_URLS, DB_READ_YOUR_WRITES_SECONDS,
+)
+
+# Never copied into the cache, which may be a store shared with other services
+UNCACHED_COLUMNS = frozenset({"hashed_password"})
+
+
+class CacheBackend(Protocol):
+    """Entries are guarded by a per-key version that ``delete`` bumps.
+
+    ``set`` with the version read before a load stores nothing if the key was
+    deleted since, or is still held back by the ``hold`` seconds of a delete.
+    """
+    async def get(self, key: str) -> Optional[dict]: ...
+    async def version(self, key: str) -> int: ...
+    async def set(self, key: str, value: dict, ttl: int, version: int) -> None: ...
+    async def delete(self, key: str, hold: float = 0) -> None: ...
+    def stats(self) -> dict: ...
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_size: int) -> None:
+        self._cache = LRUCache(max_size)
+        # key -> (version, refill allowed after)
+        self._versions = LRUCache(max_size)
+        self._version = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self._cache.get(key)
+
+    async def version(self, key: str) -> int:
+        return self._versions.get(key, (0, 0.0))[0]
+
+    async def set(self, key: str, value: dict, ttl: int, version: int) -> None:
+        current, refill_after = self._versions.get(key, (0, 0.0))
+        if current == version and refill_after <= time.time():
+            self._cache.set(key, value, expires_at=time.time() + ttl)
+
+    async def delete(self, key: str, hold: float = 0) -> None:
+        # One counter for all keys, so a key evicted from _versions never reuses a version
+        self._version += 1
+        self._versions.set(key, (self._version, time.time() + hold))
+        self._cache.delete(key)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self._cache.stats()}
+
+
+# KEYS: entry, version, hold; ARGV: version read before the load, value, ttl
+SET_IF_VERSION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] or redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RedisCacheBackend:
+    def __init__(self, url: str, version_ttl: int) -> None:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("ENTITY_CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.from_url(url)
+        self._set_if_version = self._client.register_script(SET_IF_VERSION)
+        # Version keys only need to outlive the loads in flight when they are bumped
+        self.version_ttl = version_ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self._client.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def version(self, key: str) -> int:
+        return int(await self._client.get(f"{key}:version") or 0)
+
+    async def set(self, key: str, value: dict, ttl: int, version: int) -> None:
+        # Checked and written in one script, so a delete from another worker cannot slip in between
+        await self._set_if_version(keys=[key, f"{key}:version", f"{key}:hold"], args=[version, json.dumps(value), ttl])
+
+    async def delete(self, key: str, hold: float = 0) -> None:
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.incr(f"{key}:version")
+            pipeline.expire(f"{key}:version", self.version_ttl)
+            pipeline.delete(key)
+            if hold > 0:
+                pipeline.set(f"{key}:hold", 1, px=max(1, round(hold * 1000)))
+            await pipeline.execute()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            # Evictions happen inside redis and are reported by its INFO command
+            "evictions": None,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class NullCacheBackend:
+    async def get(self, key: str) -> Optional[dict]:
+        return None
+
+    async def version(self, key: str) -> int:
+        return 0
+
+    async def set(self, key: str, value: dict, ttl: int, version: int) -> None:
+        pass
+
+    async def delete(self, key: str, hold: float = 0) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+
+class EntityCache:
+    def __init__(self, backend: CacheBackend, ttl: int, refill_delay: float = 0) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        # Reads may come from a lagging replica; a just-invalidated key is not refilled
+        # until the replica has caught up, or the stale row would be cached for a full ttl
+        self.refill_delay = refill_delay
+
+    @staticmethod
+    def _key(entity, entity_id: Any) -> str:
+        return f"entity:{entity.__tablename__}:{entity_id}"
+
+    async def peek(self, entity, entity_id: Any) -> Any:
+        """The cached entity, or None; never touches the database."""
+        cached = await self.backend.get(self._key(entity, entity_id))
+        if cached is None:
+            return None
+        columns = entity.__table__.columns
+        return entity(**{name: load_column_value(columns[name], value) for name, value in cached.items()})
+
+    async def get_or_load(self, entity, entity_id: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        instance = await self.peek(entity, entity_id)
+        if instance is not None:
+            return instance
+
+        key = self._key(entity, entity_id)
+        # An invalidation while loading bumps the version, and the row, which may predate the write, is not stored
+        version = await self.backend.version(key)
+        instance = await loader()
+        if instance is not None:
+            values = {
+                name: dump_column_value(getattr(instance, name))
+                for name in entity.__table__.columns.keys() if name not in UNCACHED_COLUMNS
+            }
+            await self.backend.set(key, values, self.ttl, version)
+        return instance
+
+    async def invalidate(self, entity, entity_id: Any) -> None:
+        await self.backend.delete(self._key(entity, entity_id), self.refill_delay)
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+
+def build_backend(name: str = ENTITY_CACHE_BACKEND) -> CacheBackend:
+    if name == "redis":
+        return RedisCacheBackend(ENTITY_CACHE_URL, ENTITY_CACHE_TTL_SECONDS)
+    if name == "none" or ENTITY_CACHE_SIZE <= 0:
+        return NullCacheBackend()
+    return MemoryCacheBackend(ENTITY_CACHE_SIZE)
+
+entity_cache = EntityCache(build_backend(), ENTITY_CACHE_TTL_SECONDS, DB_READ_YOUR_WRITES_SECONDS if DB_REPLICA_URLS else 0)
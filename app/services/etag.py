@@ -0,0 +1,81 @@
+""" Weak ETags and conditional GET support
+
+Entity ETags derive from ``id`` + ``updated_at``. Collection ETags derive from
+the row count, the max ``updated_at`` and a digest of the row ids. The same
+values can be computed by one aggregate query, so an ``If-None-Match`` check
+never has to load or serialize the rows themselves.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fastapi import Response
+from sqlalchemy import Select, Text, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.entity_cache import entity_cache
+from app.services.exception import NotModifiedError
+
+
+def _weak_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+def _timestamp(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+def entity_etag(entity_id: Any, updated_at) -> str:
+    return _weak_etag(entity_id, _timestamp(updated_at))
+
+def rows_etag(rows: list) -> str:
+    ids = sorted(row.id for row in rows)
+    id_digest = hashlib.md5(",".join(str(row_id) for row_id in ids).encode()).hexdigest() if ids else None
+    max_updated_at = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+    return _weak_etag(len(rows), _timestamp(max_updated_at), id_digest)
+
+def etag_statement(query: Select) -> Select:
+    rows = query.subquery()
+    return select(
+        func.count(),
+        func.max(rows.c.updated_at),
+        func.md5(func.string_agg(cast(rows.c.id, Text), aggregate_order_by(literal(","), rows.c.id))),
+    )
+
+async def execute_etag_statement(db: AsyncSession, statement: Select, params: Optional[dict] = None) -> str:
+    """Run an etag_statement(); the result equals rows_etag() of the wrapped query's rows."""
+    count, max_updated_at, id_digest = (await db.execute(statement, params or {})).one()
+    return _weak_etag(count, _timestamp(max_updated_at), id_digest)
+
+async def query_etag(db: AsyncSession, query: Select) -> str:
+    return await execute_etag_statement(db, etag_statement(query))
+
+async def entity_version(db: AsyncSession, entity, entity_id: Any, *columns) -> Any:
+    """``id``, ``updated_at`` and ``columns`` of one entity, from the entity cache when possible."""
+    cached = await entity_cache.peek(entity, entity_id)
+    if cached is not None:
+        return cached
+    return (await db.execute(select(entity.id, entity.updated_at, *columns).where(entity.id == entity_id))).first()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+@dataclass
+class ConditionalRequest:
+    """Carries the client's If-None-Match into a service call and the resulting ETag back out."""
+    if_none_match: Optional[str] = None
+    etag: Optional[str] = None
+
+    def check(self, etag: str) -> None:
+        self.etag = etag
+        if self.if_none_match and etag_matches(self.if_none_match, etag):
+            raise NotModifiedError(etag)
+
+def set_etag(response: Response, conditional: ConditionalRequest) -> None:
+    if conditional.etag:
+        response.headers["ETag"] = conditional.etag
@@ -2,8 +2,8 @@ from fastapi import HTTPException, status
 
 
 class ResourceNotFoundError(HTTPException):
-    def __init__(self):
-        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
+    def __init__(self, msg=None):
+        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found" if msg is None else msg)
 
 
 class UnAuthorizedError(HTTPException):
@@ -26,3 +26,13 @@ class InvalidInputError(HTTPException):
 class BusinessRuleViolationError(HTTPException):
     def __init__(self, msg=None):
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+
+class ServiceUnavailableError(HTTPException):
+    def __init__(self, msg=None):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Service temporarily unavailable" if msg is None else msg,
+                            headers={"Retry-After": "1"})
+
+class NotModifiedError(HTTPException):
+    def __init__(self, etag: str):
+        super().__init__(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator
+from uuid import UUID
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from app.database import AsyncSessionLocal
+from app.services.exception import InvalidInputError
+from app.settings import EXPORT_CHUNK_SIZE
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _export_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+def _ndjson_chunk(rows: list, fields: list[str]) -> str:
+    return "".join(
+        json.dumps({field: _export_value(getattr(row, field)) for field in fields}) + "\n"
+        for row in rows
+    )
+
+def _csv_chunk(rows: list, fields: list[str], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_export_value(getattr(row, field)) for field in fields])
+    return buffer.getvalue()
+
+async def _stream_rows(query: Select, fields: list[str], export_format: str) -> AsyncIterator[str]:
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the export owns its session for the whole response.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        header = True
+        async for rows in result.partitions():
+            if export_format == "csv":
+                yield _csv_chunk(rows, fields, header)
+                header = False
+            else:
+                yield _ndjson_chunk(rows, fields)
+            db.expunge_all()
+        if export_format == "csv" and header:
+            yield _csv_chunk([], fields, header)
+
+def stream_export(query: Select, fields: list[str], export_format: str, filename: str) -> StreamingResponse:
+    export_format = export_format.lower()
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise InvalidInputError("Invalid export format")
+    return StreamingResponse(
+        _stream_rows(query, fields, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
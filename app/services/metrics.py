@@ -0,0 +1,231 @@
+""" Per-request performance instrumentation
+
+Each HTTP request gets a ``RequestStats`` in a context variable. The SQL event
+hooks, the dependency timers and ``InstrumentedAPIRoute`` fill it in. When the
+response is done, ``MetricsMiddleware`` folds it into Prometheus-style
+histograms that are rendered at ``/metrics``.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: dict = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, labels))
+                prefix = f"{label_text}," if label_text else ""
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Total request latency",
+                             ("method", "route", "status"))
+DEPENDENCY_DURATION = Histogram("http_request_dependency_seconds", "Time spent resolving a dependency",
+                                ("route", "dependency"))
+SQL_STATEMENTS = Histogram("http_request_sql_statements", "SQL statements executed per request",
+                           ("route",), STATEMENT_BUCKETS)
+DB_DURATION = Histogram("http_request_db_seconds", "Time spent executing SQL per request", ("route",))
+SERIALIZATION_DURATION = Histogram("http_request_serialization_seconds",
+                                   "Time spent validating and encoding the response", ("route",))
+HISTOGRAMS = [REQUEST_DURATION, DEPENDENCY_DURATION, SQL_STATEMENTS, DB_DURATION, SERIALIZATION_DURATION]
+
+
+@dataclass
+class RequestStats:
+    sql_statements: int = 0
+    db_time: float = 0.0
+    dependencies: dict = field(default_factory=dict)
+    endpoint_time: float = 0.0
+    handler_time: float = 0.0
+    # Encoding done inside the endpoint by the fast serialization path
+    serialization_time: float = 0.0
+    # (statement, seconds) of every SQL statement; only collected for profiled requests
+    statements: Optional[list] = None
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+@contextmanager
+def track_dependency(name: str):
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.dependencies[name] = stats.dependencies.get(name, 0.0) + time.perf_counter() - started_at
+
+
+# The start time lives on the statement's execution context: a failed statement never reaches
+# after_cursor_execute, and anything kept on the pooled connection would outlive it
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = context._query_started_at
+    stats = _request_stats.get()
+    if stats is not None:
+        elapsed = time.perf_counter() - started_at
+        stats.sql_statements += 1
+        stats.db_time += elapsed
+        if stats.statements is not None:
+            stats.statements.append((statement, elapsed))
+
+def instrument_engine(sync_engine) -> None:
+    """Count and time SQL statements; pass ``async_engine.sync_engine`` for the async engine."""
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    # include_router builds the routes again from the already wrapped endpoints
+    if getattr(endpoint, "__timed__", False):
+        return endpoint
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                stats = _request_stats.get()
+                if stats is not None:
+                    stats.endpoint_time += time.perf_counter() - started_at
+        async_wrapper.__timed__ = True
+        return async_wrapper
+
+    @wraps(endpoint)
+    def sync_wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.endpoint_time += time.perf_counter() - started_at
+    sync_wrapper.__timed__ = True
+    return sync_wrapper
+
+
+class InstrumentedAPIRoute(APIRoute):
+    """APIRoute that times the endpoint body and the whole route handler.
+
+    The handler covers dependency resolution, the endpoint and response
+    validation/encoding, so serialization time is what remains after
+    subtracting the other two.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def instrumented_handler(request):
+            started_at = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                stats = _request_stats.get()
+                if stats is not None:
+                    stats.handler_time += time.perf_counter() - started_at
+        return instrumented_handler
+
+
+def record_request(method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+    REQUEST_DURATION.observe((method, route, str(status)), duration)
+    for name, elapsed in stats.dependencies.items():
+        DEPENDENCY_DURATION.observe((route, name), elapsed)
+    SQL_STATEMENTS.observe((route,), stats.sql_statements)
+    DB_DURATION.observe((route,), stats.db_time)
+    if stats.handler_time:
+        serialization = stats.handler_time - stats.endpoint_time - sum(stats.dependencies.values()) + stats.serialization_time
+        SERIALIZATION_DURATION.observe((route,), max(0.0, serialization))
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started_at
+            _request_stats.reset(token)
+            route = scope.get("route")
+            record_request(scope["method"], route.path if route is not None else "unmatched",
+                           status_code, duration, stats)
+
+
+def render_gauges(name: str, documentation: str, samples: dict) -> list[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples.items():
+        label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+        lines.append(f"{name}{{{label_text}}} {value}")
+    return lines
+
+def render_histograms() -> list[str]:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return lines
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlalchemy import Integer, Select, and_, bindparam, or_, tuple_
+
+from app.services.exception import InvalidInputError
+from app.services.utils import dump_column_value, load_column_value
+
+DEFAULT_CURSOR_PAGE_SIZE = 50
+
+
+def encode_cursor(order_by: Optional[str], order_direction: Optional[str], value: Any, last_id: UUID) -> str:
+    payload = {"o": order_by, "d": order_direction, "v": dump_column_value(value), "id": str(last_id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        payload["id"] = UUID(payload["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidInputError("Invalid cursor")
+    return payload
+
+def _keyset_condition(column, id_column, nullable: bool, value: Any, last_id: UUID, descending: bool):
+    # Postgres sorts NULLs last for ASC and first for DESC, so nullable
+    # columns cannot use a plain row comparison.
+    if not nullable:
+        if descending:
+            return tuple_(column, id_column) < tuple_(value, last_id)
+        return tuple_(column, id_column) > tuple_(value, last_id)
+
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), id_column < last_id), column.isnot(None))
+        return or_(column < value, and_(column == value, id_column < last_id))
+
+    if value is None:
+        return and_(column.is_(None), id_column > last_id)
+    return or_(column > value, and_(column == value, id_column > last_id), column.is_(None))
+
+def parse_cursor(entity, order_by: Optional[str], order_direction: Optional[str], cursor: str) -> Optional[dict]:
+    """Decode and check ``cursor`` against the requested sort; None for the first page."""
+    if order_by and order_by not in entity.get_sortable_fields():
+        raise InvalidInputError("Invalid sort field")
+    if not cursor:
+        return None
+    payload = decode_cursor(cursor)
+    if payload.get("o") != order_by or payload.get("d") != order_direction:
+        raise InvalidInputError("Cursor does not match the requested sort")
+    if order_by:
+        payload["v"] = load_column_value(entity.__table__.columns[order_by], payload.get("v"))
+    return payload
+
+def cursor_params(after: Optional[dict], page_size: int) -> dict:
+    # One extra row tells the caller whether a next page exists
+    params = {"limit": page_size + 1}
+    if after is not None:
+        params.update(cursor_value=after.get("v"), cursor_id=after["id"])
+    return params
+
+def apply_cursor(query: Select, entity, order_by: Optional[str], order_direction: Optional[str],
+                 after: Optional[dict]) -> Select:
+    """Apply keyset pagination to a search query.
+
+    The page is ordered by ``order_by`` (if any) with ``id`` as tiebreaker.
+    Only the shape of ``after`` (absent, NULL sort value, or a value) affects
+    the statement; the values are bound from cursor_params().
+    """
+    descending = order_direction == 'desc'
+    id_column = entity.id
+
+    if after is not None:
+        last_id = bindparam("cursor_id", type_=id_column.type)
+        if order_by:
+            column = getattr(entity, order_by)
+            value = None if after.get("v") is None else bindparam("cursor_value", type_=column.type)
+            nullable = entity.__table__.columns[order_by].nullable
+            query = query.where(_keyset_condition(column, id_column, nullable, value, last_id, descending))
+        else:
+            query = query.where(id_column < last_id if descending else id_column > last_id)
+
+    if order_by:
+        column = getattr(entity, order_by)
+        query = query.order_by(column.desc() if descending else column)
+    query = query.order_by(id_column.desc() if descending else id_column)
+    return query.limit(bindparam("limit", type_=Integer))
+
+def build_cursor_page(rows: list, order_by: Optional[str], order_direction: Optional[str], page_size: int) -> dict:
+    items = list(rows[:page_size])
+    next_cursor = None
+    if len(rows) > page_size and items:
+        last = items[-1]
+        value = getattr(last, order_by) if order_by else None
+        next_cursor = encode_cursor(order_by, order_direction, value, last.id)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,99 @@
+""" Password hashing off the event loop
+
+bcrypt costs 100-300 ms of CPU per call, so hashing and verification run on a
+dedicated thread pool (bcrypt releases the GIL). The number of pending jobs is
+bounded; once the queue is full new requests fail fast with 503 instead of
+piling up behind a login burst.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.entities.user import get_password_hash, verify_password
+from app.services.exception import ServiceUnavailableError
+from app.settings import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE
+
+
+class PasswordHashPool:
+    def __init__(self, max_workers: int, max_queue_size: int) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                self._rejected += 1
+                raise ServiceUnavailableError("Too many concurrent authentication requests")
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    wait = started_at - submitted_at
+                    self._total_wait += wait
+                    self._max_wait = max(self._max_wait, wait)
+                    self._total_run += finished_at - started_at
+
+        def release(_future) -> None:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+        try:
+            future = self._get_executor().submit(job)
+        except BaseException:
+            release(None)
+            raise
+        # A cancelled request does not stop a running hash; the slot is freed when the job is
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.max_workers,
+                "queue_size": self.max_queue_size,
+                "in_flight": self._pending,
+                "queued": max(0, self._pending - self.max_workers),
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / completed * 1000, 3) if completed else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "avg_run_ms": round(self._total_run / completed * 1000, 3) if completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE)
+
+async def hash_password(password: str) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
@@ -0,0 +1,174 @@
+""" On-demand request profiling
+
+``ProfilingMiddleware`` is only installed when ``PROFILING_ENABLED`` is set. It
+then profiles a request that an admin sends with ``X-Profile: 1``, or any
+request with probability ``PROFILING_SAMPLE_RATE``. Other requests pay for one
+header lookup.
+
+A profiled request runs with a statistical sampler: a thread that reads the
+event loop thread's stack every ``PROFILING_INTERVAL_MS`` while the request's
+task is the one running. The SQL statements the request awaited are added as
+synthetic ``[sql]`` frames weighted by their duration, so the graph shows wall
+time rather than CPU time alone. Every profile writes two files to
+``PROFILING_DIR``:
+
+- ``<id>.folded``, collapsed stacks weighted in microseconds, for flamegraph.pl,
+  speedscope or inferno;
+- ``<id>.json``, the route, status, timings and the SQL statements.
+
+The response carries the id in the ``X-Profile-Id`` header.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from app.services.auth import authorizer
+from app.services.metrics import current_request_stats
+from app.settings import PROFILING_SAMPLE_RATE, PROFILING_INTERVAL_MS, PROFILING_DIR
+
+PROFILE_HEADER = b"x-profile"
+SQL_LABEL_LENGTH = 120
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    cwd = os.getcwd()
+    if filename.startswith(cwd):
+        filename = os.path.relpath(filename, cwd)
+    # Semicolons separate frames in the folded format
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+def _sql_label(statement: str) -> str:
+    return "[sql] " + re.sub(r"\s+", " ", statement).strip()[:SQL_LABEL_LENGTH].replace(";", ",")
+
+
+class StackSampler:
+    """Samples the calling thread's stack from a background thread while its task is running.
+
+    ``samples`` maps folded stacks to the microseconds they were seen for.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # The GIL can delay a wakeup well past the interval, so each sample weighs the time it covers
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            # Other requests share the loop thread; only this request's steps are its samples
+            if asyncio.current_task(self._loop) is not self._task:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += round(elapsed * 1_000_000)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, directory: str = PROFILING_DIR, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 interval_ms: float = PROFILING_INTERVAL_MS) -> None:
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+
+    def _requested_by_admin(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER) != b"1":
+            return False
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer":
+            return False
+        try:
+            return bool(authorizer.authorize(token).is_admin)
+        except Exception:
+            # A bad token is rejected by the endpoint's own authorizer, not here
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+                self._requested_by_admin(scope) or (self.sample_rate > 0 and random.random() < self.sample_rate)):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid4().hex[:8]}"
+        stats = current_request_stats()
+        if stats is not None:
+            stats.statements = []
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        started_at = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - started_at
+            route = scope.get("route")
+            profile = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route.path if route is not None else "unmatched",
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "interval_ms": self.interval * 1000,
+                "sampled_ms": round(sum(sampler.samples.values()) / 1000, 3),
+            }
+            if stats is not None:
+                profile.update(
+                    db_ms=round(stats.db_time * 1000, 3),
+                    dependencies_ms={name: round(elapsed * 1000, 3) for name, elapsed in stats.dependencies.items()},
+                    endpoint_ms=round(stats.endpoint_time * 1000, 3),
+                    sql=[{"statement": statement, "ms": round(elapsed * 1000, 3)} for statement, elapsed in stats.statements],
+                )
+            await asyncio.to_thread(self._write, profile, sampler.samples,
+                                    stats.statements if stats is not None else [])
+
+    def _write(self, profile: dict, samples: Counter, statements: list) -> None:
+        root = f"{profile['method']} {profile['route']}"
+        lines = [f"{root};{stack} {count}" for stack, count in samples.items()]
+        sql_weights = Counter()
+        for statement, elapsed in statements:
+            sql_weights[_sql_label(statement)] += round(elapsed * 1_000_000)
+        lines.extend(f"{root};{label} {weight}" for label, weight in sql_weights.items())
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile["id"])
+        with open(f"{base}.folded", "w") as folded:
+            folded.write("\n".join(lines) + "\n")
+        with open(f"{base}.json", "w") as summary:
+            json.dump(profile, summary, indent=2)
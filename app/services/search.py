@@ -0,0 +1,216 @@
+import json
+from enum import Enum
+from typing import Callable, Optional
+
+from sqlalchemy import Integer, Select, String, bindparam, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.cache import LRUCache
+from app.services.etag import ConditionalRequest, etag_statement, execute_etag_statement, rows_etag
+from app.services.exception import InvalidInputError
+from app.services.pagination import DEFAULT_CURSOR_PAGE_SIZE, apply_cursor, build_cursor_page, cursor_params, parse_cursor
+from app.services.text_search import SearchMode, parse_search_mode, text_condition, text_pattern, order_by_relevance
+from app.settings import SEARCH_STATEMENT_CACHE_SIZE
+
+
+class CountMode(Enum):
+    # Exact count, computed in the same statement as the page
+    EXACT = "exact"
+    # Planner estimate; table statistics when unfiltered, EXPLAIN rows otherwise
+    ESTIMATE = "estimate"
+
+
+# Search statements keyed by their shape: entity, search mode, active filters,
+# ranking, sort and paging style. Filter values, cursor values and limits are
+# bind parameters, so every request of one shape executes the same statement
+# object. SQLAlchemy then reuses its memoized cache key and compiled SQL, and
+# the identical SQL text hits asyncpg's prepared statement cache.
+search_statements = LRUCache(SEARCH_STATEMENT_CACHE_SIZE)
+
+def cached_statement(key: tuple, build: Callable[[], Select]) -> Select:
+    statement = search_statements.get(key)
+    if statement is None:
+        statement = build()
+        search_statements.set(key, statement)
+    return statement
+
+def parse_count_mode(value: Optional[str]) -> CountMode:
+    if value is None:
+        return CountMode.EXACT
+    try:
+        return CountMode(value.lower())
+    except ValueError:
+        raise InvalidInputError("Invalid count mode")
+
+def apply_order(query: Select, entity, order_by: Optional[str], order_direction: Optional[str]) -> Select:
+    if order_by:
+        if order_by in entity.get_sortable_fields():
+            order_column = getattr(entity, order_by)
+            query = query.order_by(order_column.desc() if order_direction == 'desc' else order_column)
+        else:
+            raise InvalidInputError("Invalid sort field")
+    return query
+
+def filtered_statement(entity, search_mode: SearchMode, text_columns: tuple, filter_columns: tuple) -> Select:
+    """``select(entity)`` filtered on the given columns, with bind parameters text_<name> and filter_<name>."""
+    conditions = [
+        text_condition(getattr(entity, name), bindparam(f"text_{name}", type_=String), search_mode)
+        for name in text_columns
+    ]
+    conditions.extend(
+        getattr(entity, name) == bindparam(f"filter_{name}", type_=getattr(entity, name).type)
+        for name in filter_columns
+    )
+    return select(entity).where(*conditions)
+
+def _total_column(filtered_query: Select, cursor_mode: bool):
+    # A window count sees every filtered row before OFFSET/LIMIT apply. Keyset
+    # conditions narrow the WHERE clause, so cursor pages count via a scalar subquery.
+    if cursor_mode:
+        counted = filtered_query.order_by(None).subquery()
+        return select(func.count()).select_from(counted).scalar_subquery().label("total")
+    return func.count().over().label("total")
+
+def count_statement(filtered_query: Select) -> Select:
+    return select(func.count()).select_from(filtered_query.order_by(None).subquery())
+
+async def count_estimate(db: AsyncSession, entity, filtered_query: Select, params: Optional[dict] = None) -> int:
+    # A view has no table statistics of its own, so it is always estimated via EXPLAIN
+    if filtered_query.whereclause is None and not entity.__table__.info.get("is_view"):
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+            {"table_name": entity.__tablename__},
+        )
+        # reltuples is -1 until the table has been vacuumed or analyzed
+        if estimate is not None and estimate >= 0:
+            return estimate
+        return await db.scalar(count_statement(filtered_query))
+
+    connection = await db.connection()
+    explained = filtered_query.params(params or {}).order_by(None)
+    compiled = explained.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def facet_statement(filtered_query: Select, facet_columns: dict) -> Select:
+    """Count the filtered rows per value of every facet column with one GROUPING SETS query."""
+    columns = list(facet_columns.values())
+    return (
+        filtered_query.order_by(None)
+        .with_only_columns(*columns, *[func.grouping(column) for column in columns], func.count())
+        .group_by(func.grouping_sets(*columns))
+    )
+
+async def facet_counts(db: AsyncSession, statement: Select, names: list, params: dict) -> dict:
+    facets = {name: {} for name in names}
+    for row in (await db.execute(statement, params)).all():
+        values, groupings, count = row[:len(names)], row[len(names):-1], row[-1]
+        for name, value, grouping in zip(names, values, groupings):
+            if grouping == 0:
+                facets[name][value.name if isinstance(value, Enum) else str(value)] = count
+    return facets
+
+async def execute_search(db: AsyncSession, entity, request, text_filters: dict, filters: dict,
+                         facet_columns: Optional[dict] = None, conditional: Optional[ConditionalRequest] = None) -> list | dict:
+    """Filter, order, page and run a search.
+
+    ``text_filters`` and ``filters`` map column names to the requested term or
+    value; falsy entries are inactive. Returns the bare list of rows for plain
+    offset paging, and a page dict (items, next_cursor, total, facets) for
+    cursor paging or when a total or facets were asked for. Results without a
+    total or facets get an ETag on ``conditional``; a matching If-None-Match is
+    answered from one aggregate query without loading the page.
+    """
+    search_mode = parse_search_mode(request.search_mode)
+    text_columns = tuple(name for name, term in text_filters.items() if term)
+    filter_columns = tuple(name for name, value in filters.items() if value)
+    params = {f"text_{name}": text_pattern(text_filters[name], search_mode) for name in text_columns}
+    params.update({f"filter_{name}": filters[name] for name in filter_columns})
+
+    cursor_mode = request.cursor is not None
+    rank = bool(request.rank) and bool(text_columns)
+    if request.rank and cursor_mode:
+        raise InvalidInputError("Relevance ranking is not supported with cursor paging")
+    if rank:
+        params.update({f"rank_{name}": text_filters[name] for name in text_columns})
+    if request.order_by and request.order_by not in entity.get_sortable_fields():
+        raise InvalidInputError("Invalid sort field")
+
+    if cursor_mode:
+        page_size = request.page_size or DEFAULT_CURSOR_PAGE_SIZE
+        after = parse_cursor(entity, request.order_by, request.order_direction, request.cursor)
+        params.update(cursor_params(after, page_size))
+        paging = ("cursor", None if after is None else after.get("v") is None)
+    else:
+        paged = bool(request.page and request.page_size)
+        if paged:
+            params.update(offset=(request.page - 1) * request.page_size, limit=request.page_size)
+        paging = ("offset", paged)
+    count_mode = parse_count_mode(request.count_mode) if request.include_total else None
+
+    filtered_key = (entity.__tablename__, search_mode, text_columns, filter_columns)
+    filtered_query = cached_statement(("filtered", *filtered_key),
+                                      lambda: filtered_statement(entity, search_mode, text_columns, filter_columns))
+    page_key = (*filtered_key, rank, request.order_by, request.order_direction, paging)
+
+    def build_page() -> Select:
+        query = filtered_query
+        if rank:
+            query = order_by_relevance(query, [(getattr(entity, name), bindparam(f"rank_{name}", type_=String))
+                                               for name in text_columns])
+        if cursor_mode:
+            return apply_cursor(query, entity, request.order_by, request.order_direction, after)
+        query = apply_order(query, entity, request.order_by, request.order_direction)
+        if paged:
+            query = query.offset(bindparam("offset", type_=Integer)).limit(bindparam("limit", type_=Integer))
+        return query
+    query = cached_statement(("page", *page_key), build_page)
+
+    # The ETag covers the fetched rows only, so it cannot vouch for a total or facets
+    conditional = conditional if count_mode is None and not (request.include_facets and facet_columns) else None
+    if conditional and conditional.if_none_match:
+        statement = cached_statement(("etag", *page_key), lambda: etag_statement(query))
+        conditional.check(await execute_etag_statement(db, statement, params))
+
+    total = None
+    if count_mode == CountMode.EXACT:
+        counted_query = cached_statement(("page_total", *page_key),
+                                         lambda: query.add_columns(_total_column(filtered_query, cursor_mode)))
+        rows = (await db.execute(counted_query, params)).all()
+        items = [row[0] for row in rows]
+        if rows:
+            total = rows[0][1]
+        else:
+            first_page = not request.cursor if cursor_mode else (request.page or 1) == 1
+            if first_page:
+                total = 0
+            else:
+                total = await db.scalar(cached_statement(("count", *filtered_key), lambda: count_statement(filtered_query)), params)
+    else:
+        items = (await db.scalars(query, params)).all()
+        if count_mode == CountMode.ESTIMATE:
+            total = await count_estimate(db, entity, filtered_query, params)
+    if conditional:
+        # In cursor mode this includes the look-ahead row, so a new next page changes the ETag
+        conditional.etag = rows_etag(items)
+
+    facets = None
+    if request.include_facets and facet_columns:
+        statement = cached_statement(("facets", *filtered_key, tuple(facet_columns)),
+                                     lambda: facet_statement(filtered_query, facet_columns))
+        facets = await facet_counts(db, statement, list(facet_columns), params)
+
+    if cursor_mode:
+        page = build_cursor_page(items, request.order_by, request.order_direction, page_size)
+    elif total is None and facets is None:
+        return items
+    else:
+        page = {"items": items, "next_cursor": None}
+    if total is not None:
+        page["total"] = total
+        page["total_is_estimate"] = count_mode == CountMode.ESTIMATE
+    if facets is not None:
+        page["facets"] = facets
+    return page
@@ -0,0 +1,217 @@
+""" Result cache for the search endpoints
+
+Entries are keyed by the entity, the caller's visibility scope and the
+normalized filters, sort and page. Each entry is tagged with the scope columns
+it was filtered on (a task search for one user is tagged with that user id),
+or with a wildcard tag when it was not. A write invalidates the wildcard tag
+and the tags of the ids it touched, so other users' entries survive it.
+
+Rows are cached as transient copies, so cached values never hold on to a
+session. An entry is fresh for ``ttl`` seconds. For ``stale`` more seconds it
+is still served while one background task reloads it (stale-while-revalidate).
+Invalidated entries are dropped, never served stale.
+
+The cache lives in the process, and so does its invalidation. With several
+workers, ``ttl`` bounds how long another worker's write goes unseen.
+"""
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import replicas
+from app.services.cache import LRUCache
+from app.services.etag import ConditionalRequest
+from app.settings import (
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_MAX_ROWS, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_STALE_SECONDS,
+    DB_REPLICA_URLS, DB_READ_YOUR_WRITES_SECONDS,
+)
+
+# Request options that are matched case-insensitively; cursors and column names are not
+CASE_INSENSITIVE_OPTIONS = frozenset({"order_direction", "search_mode", "count_mode"})
+
+Loader = Callable[[AsyncSession, ConditionalRequest], Awaitable[Any]]
+
+
+def search_key(entity, scope: str, request, text_filters: dict, filters: dict) -> tuple:
+    # Every text mode matches case-insensitively (ILIKE, pg_trgm), so terms are lowercased
+    options = tuple(sorted(
+        (name, value.lower() if name in CASE_INSENSITIVE_OPTIONS and isinstance(value, str) else value)
+        for name, value in vars(request).items()
+        if value is not None and name not in text_filters and name not in filters
+    ))
+    return (
+        entity.__tablename__,
+        scope,
+        tuple((name, term.lower()) for name, term in text_filters.items() if term),
+        tuple((name, value) for name, value in filters.items() if value),
+        options,
+    )
+
+def search_tags(entity, filters: dict, scope_columns: tuple) -> tuple:
+    table = entity.__tablename__
+    scoped = tuple((table, name, str(filters[name])) for name in scope_columns if filters.get(name))
+    return ((table,), *(scoped or ((table, "*"),)))
+
+def _detach(entity, row):
+    return entity(**{name: getattr(row, name) for name in entity.__table__.columns.keys()})
+
+def _row_count(result) -> int:
+    return len(result["items"] if isinstance(result, dict) else result)
+
+
+class SearchResultCache:
+    def __init__(self, max_size: int, max_rows: int, ttl: float, stale: float, refill_delay: float = 0) -> None:
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.stale = stale
+        # As in EntityCache: a lagging replica must not refill a just-invalidated tag
+        self.refill_delay = refill_delay
+        self._entries: OrderedDict = OrderedDict()
+        self._tags: dict = {}
+        self._sequence = itertools.count(1)
+        # tag -> sequence number of its last invalidation, for loads still in flight
+        self._invalidated = LRUCache(max(1, max_size * 4), ttl=max(60.0, refill_delay))
+        self._refreshing: dict = {}
+        self.counts = {"hits": 0, "stale_hits": 0, "misses": 0, "skipped_fills": 0,
+                       "evictions": 0, "invalidations": 0, "refreshes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    async def get_or_load(self, db: AsyncSession, entity, key: tuple, tags: tuple, load: Loader,
+                          conditional: Optional[ConditionalRequest] = None) -> Any:
+        """The cached result for ``key``, or ``load(db, conditional)``'s, which is then cached."""
+        if not self.enabled:
+            return await load(db, conditional)
+
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry["stale_until"] <= now:
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry["fresh_until"] > now:
+                self.counts["hits"] += 1
+            else:
+                self.counts["stale_hits"] += 1
+                self._refresh(entity, key, tags, load)
+            # Results with a total or facets carry no ETag
+            if conditional is not None and entry["etag"] is not None:
+                conditional.check(entry["etag"])
+            return entry["result"]
+
+        self.counts["misses"] += 1
+        # The ETag is recorded even when the caller sent no If-None-Match
+        fill_conditional = conditional if conditional is not None else ConditionalRequest(None)
+        started = next(self._sequence)
+        result = await load(db, fill_conditional)
+        self._fill(entity, key, tags, result, fill_conditional.etag, started)
+        return result
+
+    def _fill(self, entity, key: tuple, tags: tuple, result: Any, etag: Optional[str], started: int) -> None:
+        if _row_count(result) > self.max_rows or self._invalidated_since(tags, started):
+            self.counts["skipped_fills"] += 1
+            return
+        if isinstance(result, dict):
+            result = {**result, "items": [_detach(entity, row) for row in result["items"]]}
+        else:
+            result = [_detach(entity, row) for row in result]
+        now = time.monotonic()
+        self._drop(key)
+        self._entries[key] = {
+            "result": result,
+            "etag": etag,
+            "tags": tags,
+            "fresh_until": now + self.ttl,
+            "stale_until": now + self.ttl + self.stale,
+        }
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+            self.counts["evictions"] += 1
+
+    def _invalidated_since(self, tags: tuple, started: int) -> bool:
+        now = time.monotonic()
+        for tag in tags:
+            invalidated = self._invalidated.get(tag)
+            if invalidated is not None and (invalidated[0] > started or invalidated[1] + self.refill_delay > now):
+                return True
+        return False
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry["tags"]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _refresh(self, entity, key: tuple, tags: tuple, load: Loader) -> None:
+        if key in self._refreshing:
+            return
+        self.counts["refreshes"] += 1
+        self._refreshing[key] = asyncio.create_task(self._reload(entity, key, tags, load))
+
+    async def _reload(self, entity, key: tuple, tags: tuple, load: Loader) -> None:
+        # The request's session closes with the request, so the reload opens its own
+        try:
+            started = next(self._sequence)
+            conditional = ConditionalRequest(None)
+            async with await replicas.read_session() as session:
+                result = await load(session, conditional)
+            self._fill(entity, key, tags, result, conditional.etag, started)
+        except Exception:
+            # The stale entry expires on its own; the next miss reports the error
+            pass
+        finally:
+            self._refreshing.pop(key, None)
+
+    def invalidate(self, entity, scopes: Optional[dict] = None) -> None:
+        """Drop ``entity``'s entries that a write to rows with the given scope values may affect.
+
+        ``scopes`` maps scope columns to the values (or iterables of values)
+        the write touched. Without it every entry of the entity is dropped.
+        """
+        if not self.enabled:
+            return
+        table = entity.__tablename__
+        if scopes is None:
+            tags = [(table,)]
+        else:
+            tags = [(table, "*")]
+            for name, values in scopes.items():
+                if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+                    values = (values,)
+                tags.extend((table, name, str(value)) for value in values if value is not None)
+        sequence = next(self._sequence)
+        now = time.monotonic()
+        for tag in tags:
+            self._invalidated.set(tag, (sequence, now))
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+                self.counts["invalidations"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.counts["hits"] + self.counts["stale_hits"] + self.counts["misses"]
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            **self.counts,
+            "hit_ratio": round((self.counts["hits"] + self.counts["stale_hits"]) / lookups, 4) if lookups else 0.0,
+        }
+
+search_cache = SearchResultCache(
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_MAX_ROWS, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_STALE_SECONDS,
+    DB_READ_YOUR_WRITES_SECONDS if DB_REPLICA_URLS else 0,
+)
@@ -0,0 +1,54 @@
+""" Response serialization
+
+In ``validated`` mode endpoints hand ORM rows to FastAPI. FastAPI revalidates
+them against the route's response_model (``from_attributes``) and encodes the
+result with ``jsonable_encoder`` and the stdlib json module. In ``fast`` mode the
+model's fields are read straight off the rows and encoded in one orjson pass.
+The rows were just loaded from typed columns, so validating them again buys
+nothing. The response_model stays on the route for the OpenAPI schema.
+"""
+import time
+from typing import Any, Optional
+from uuid import UUID
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from app.models.pagination import SearchPageModel
+from app.services.metrics import current_request_stats
+from app.settings import RESPONSE_SERIALIZATION
+
+
+def _value(value: Any) -> Any:
+    # asyncpg returns its own UUID subclass, which orjson refuses to encode
+    return str(value) if isinstance(value, UUID) else value
+
+def _row(row, fields: tuple) -> dict:
+    return {name: _value(getattr(row, name)) for name in fields}
+
+def to_content(result: Any, model: type[BaseModel]) -> Any:
+    """Plain data for a row, a list of rows or a search page dict, limited to ``model``'s fields."""
+    fields = tuple(model.model_fields)
+    if isinstance(result, dict):
+        content = {name: result.get(name) for name in SearchPageModel.model_fields}
+        content["items"] = [_row(row, fields) for row in result["items"]]
+        return content
+    if isinstance(result, (list, tuple)):
+        return [_row(row, fields) for row in result]
+    return _row(result, fields)
+
+def serialize_response(result: Any, model: type[BaseModel], response: Optional[Response] = None) -> Any:
+    """Encode ``result`` on the fast path, or return it untouched for FastAPI to validate.
+
+    ``response`` is the endpoint's injected Response. A returned Response skips
+    FastAPI's header merge, so its headers (e.g. ETag) are copied over here.
+    """
+    if RESPONSE_SERIALIZATION != "fast":
+        return result
+    started_at = time.perf_counter()
+    encoded = ORJSONResponse(to_content(result, model), headers=dict(response.headers) if response is not None else None)
+    stats = current_request_stats()
+    if stats is not None:
+        stats.serialization_time += time.perf_counter() - started_at
+    return encoded
@@ -0,0 +1,46 @@
+""" Database session dependencies for the routers
+
+Write endpoints get a primary session. Read-only endpoints get a replica
+session, but a user's reads go to the primary for
+``DB_READ_YOUR_WRITES_SECONDS`` after one of their writes, so replication lag
+never hides their own changes. Writes are tracked per process.
+"""
+import time
+
+from fastapi import Depends
+
+from app.database import AsyncSessionLocal, replicas
+from app.models.user import UserClaims
+from app.services.auth import authorizer
+from app.services.cache import LRUCache
+from app.services.metrics import track_dependency
+from app.settings import DB_READ_YOUR_WRITES_SECONDS
+
+_recent_writers = LRUCache(100_000)
+
+
+def record_write(user_sub: str) -> None:
+    if replicas.engines and DB_READ_YOUR_WRITES_SECONDS > 0:
+        _recent_writers.set(user_sub, True, expires_at=time.time() + DB_READ_YOUR_WRITES_SECONDS)
+
+async def get_async_db_context():
+    with track_dependency("get_db_context"):
+        async_db = AsyncSessionLocal()
+    async with async_db:
+        yield async_db
+
+async def get_write_db_context(user: UserClaims = Depends(authorizer)):
+    """Primary session for write endpoints; opens the caller's read-your-writes window."""
+    with track_dependency("get_db_context"):
+        async_db = AsyncSessionLocal()
+    async with async_db:
+        yield async_db
+    # Runs before the response is sent, so the caller's next read already sees the window
+    record_write(user.sub)
+
+async def get_read_db_context(user: UserClaims = Depends(authorizer)):
+    """Replica session for read-only endpoints, or a primary one when no replica can serve the caller."""
+    with track_dependency("get_db_context"):
+        async_db = await replicas.read_session(primary=bool(_recent_writers.get(user.sub)))
+    async with async_db:
+        yield async_db
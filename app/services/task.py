@@ -1,88 +1,209 @@
-from uuid import UUID
-from typing import Any, Callable
+from uuid import UUID, uuid4
+from typing import Any, Callable, Optional
 from functools import wraps
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from fastapi.responses import StreamingResponse
 
 from app.models.task import TaskModel, TaskSearchModel
 from app.entities.task import Task
-from app.services.utils import get_current_utc_time
+from app.entities.task_archive import TaskArchive, TaskWithArchive
+from app.entities.user import User
+from app.services.utils import get_current_utc_time, chunked, integrity_error_code, FOREIGN_KEY_VIOLATION
+from app.settings import BULK_MAX_ITEMS, BULK_INSERT_BATCH_SIZE
+from app.services.export import stream_export
+from app.services.task_feed import task_feed
+from app.services.entity_cache import entity_cache
+from app.services.task_counter import (
+    MAX_IN_PROGRESS_TASKS, reserve_in_progress_slot, move_in_progress_slot, lock_in_progress_counts, add_in_progress_counts,
+)
+from app.services.search import execute_search
+from app.services.search_cache import search_cache, search_key, search_tags
+from app.services.task_stats import apply_task_stats, read_task_stats, task_stats_key
+from app.services.etag import ConditionalRequest, entity_etag, entity_version, query_etag, rows_etag
 from app.entities.base_entity import TaskStatus, TaskPriority
 from app.services.exception import BusinessRuleViolationError, ResourceNotFoundError, AccessDeniedError, InvalidInputError
 from app.models.user import UserClaims
 
-def get_all_tasks(db: Session):
-    return db.query(select(Task)).all()
+async def get_all_tasks(db: AsyncSession, conditional: Optional[ConditionalRequest] = None) -> list[Task]:
+    query = select(Task)
+    if conditional and conditional.if_none_match:
+        conditional.check(await query_etag(db, query))
+    tasks = (await db.scalars(query)).all()
+    if conditional:
+        conditional.etag = rows_etag(tasks)
+    return tasks
+
+def export_all_tasks(export_format: str) -> StreamingResponse:
+    return stream_export(select(Task), list(Task.__table__.columns.keys()), export_format, "tasks")
 
-def create_task(request: TaskModel, db: Session, user: UserClaims):
+def stream_task_changes(user: UserClaims) -> StreamingResponse:
+    return StreamingResponse(
+        task_feed.events(user),
+        media_type="text/event-stream",
+        # Keep proxies from caching or buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def create_task(request: TaskModel, db: AsyncSession, user: UserClaims) -> Task:
     if not user.is_admin and user.sub != str(request.user_id):
         raise BusinessRuleViolationError("You are not allowed to create task for this user")
-    if request.status == TaskStatus.IN_PROGRESS:
-        count_of_in_progress_tasks = db.scalar(
-        select(func.count()).where(
-            (Task.status == TaskStatus.IN_PROGRESS) and
-            (str(Task.user_id) == str(request.user_id))
-        )
-        )
-        if count_of_in_progress_tasks >= 2:
-            raise BusinessRuleViolationError("User can have only 2 in progress tasks")
-    db_task = Task(**request.model_dump())
     current_time = get_current_utc_time()
-    db_task.created_at = current_time
-    db_task.updated_at = current_time
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    values = {**request.model_dump(), "created_at": current_time, "updated_at": current_time}
+    try:
+        if request.status == TaskStatus.IN_PROGRESS:
+            await reserve_in_progress_slot(db, request.user_id)
+        db_task = (await db.scalars(insert(Task).values(values).returning(Task))).one()
+        await apply_task_stats(db, {task_stats_key(db_task): 1})
+        await db.commit()
+    except BusinessRuleViolationError:
+        await db.rollback()
+        raise
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("User not found")
+        raise
+    search_cache.invalidate(Task, {"user_id": db_task.user_id})
     return db_task
 
-def update_task(task_id: UUID, request: TaskModel, db: Session, user: UserClaims):
-    existing_task = db.query(Task).filter(Task.id == task_id).first()
-    if not existing_task:
-        raise ResourceNotFoundError("Task not found")
+async def create_tasks_bulk(requests: list[TaskModel], db: AsyncSession, user: UserClaims) -> list[dict]:
+    if len(requests) > BULK_MAX_ITEMS:
+        raise InvalidInputError(f"At most {BULK_MAX_ITEMS} tasks can be created at once")
+
+    user_ids = {request.user_id for request in requests}
+    existing_user_ids = set((await db.scalars(select(User.id).where(User.id.in_(user_ids)))).all()) if user_ids else set()
+    # A user deleted after the existence check above fails a foreign key in the counters or the tasks
+    try:
+        in_progress_user_ids = {request.user_id for request in requests if request.status == TaskStatus.IN_PROGRESS}
+        in_progress_counts = await lock_in_progress_counts(db, in_progress_user_ids & existing_user_ids)
+        increments = {}
+        stats_deltas = {}
+
+        results = []
+        rows = []
+        current_time = get_current_utc_time()
+        for index, request in enumerate(requests):
+            error = None
+            if not user.is_admin and user.sub != str(request.user_id):
+                error = "You are not allowed to create task for this user"
+            elif request.user_id not in existing_user_ids:
+                error = "User not found"
+            elif request.status == TaskStatus.IN_PROGRESS:
+                if in_progress_counts.get(request.user_id, 0) >= MAX_IN_PROGRESS_TASKS:
+                    error = f"User can have only {MAX_IN_PROGRESS_TASKS} in progress tasks"
+                else:
+                    in_progress_counts[request.user_id] = in_progress_counts.get(request.user_id, 0) + 1
+                    increments[request.user_id] = increments.get(request.user_id, 0) + 1
+            if error:
+                results.append({"index": index, "error": error})
+                continue
+            row = request.model_dump()
+            row.update(id=uuid4(), created_at=current_time, updated_at=current_time)
+            rows.append(row)
+            key = (row["user_id"], row["status"], row["priority"])
+            stats_deltas[key] = stats_deltas.get(key, 0) + 1
+            results.append({"index": index, "id": row["id"]})
+
+        for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+            await db.execute(insert(Task), batch)
+        await add_in_progress_counts(db, increments)
+        await apply_task_stats(db, stats_deltas)
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("User not found")
+        raise
+    if rows:
+        search_cache.invalidate(Task, {"user_id": {row["user_id"] for row in rows}})
+    return results
+
+async def update_task(task_id: UUID, request: TaskModel, db: AsyncSession, user: UserClaims) -> Task:
     if not user.is_admin and user.sub != str(request.user_id):
         raise BusinessRuleViolationError("You are not allowed to update")
-    update_data_dict = request.model_dump(exclude_unset=True)
-    for field, value in update_data_dict.items():
-        setattr(existing_task, field, value)
-    existing_task.updated_at = get_current_utc_time()
-    db.commit()
-    db.refresh(existing_task)
+    # The subquery locks the task and hands its previous owner, status and priority
+    # to RETURNING, so concurrent updates apply their counter changes one at a time
+    old = select(Task.id, Task.user_id, Task.status, Task.priority).where(Task.id == task_id).with_for_update().subquery("old")
+    values = {**request.model_dump(exclude_unset=True), "updated_at": get_current_utc_time()}
+    statement = (
+        update(Task).where(Task.id == old.c.id).values(values)
+        .returning(Task, old.c.user_id, old.c.status, old.c.priority)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        row = (await db.execute(statement)).one_or_none()
+        if not row:
+            raise ResourceNotFoundError("Task not found")
+        existing_task, old_user_id, old_status, old_priority = row
+        await move_in_progress_slot(db, old_user_id, old_status == TaskStatus.IN_PROGRESS,
+                                    existing_task.user_id, existing_task.status == TaskStatus.IN_PROGRESS)
+        old_stats_key = (old_user_id, old_status, old_priority)
+        new_stats_key = task_stats_key(existing_task)
+        if new_stats_key != old_stats_key:
+            await apply_task_stats(db, {old_stats_key: -1, new_stats_key: 1})
+        await db.commit()
+    except (BusinessRuleViolationError, ResourceNotFoundError):
+        await db.rollback()
+        raise
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("User not found")
+        raise
+    await entity_cache.invalidate(Task, task_id)
+    search_cache.invalidate(Task, {"user_id": {old_user_id, existing_task.user_id}})
     return existing_task
 
-def get_task(task_id: int, db: Session, user: UserClaims):
-    task = db.query(Task).filter(Task.id == task_id).first()
+async def get_task(task_id: UUID, db: AsyncSession, user: UserClaims, conditional: Optional[ConditionalRequest] = None) -> Task:
+    if conditional and conditional.if_none_match:
+        version = await entity_version(db, Task, task_id, Task.user_id)
+        if version:
+            if not user.is_admin and user.sub != str(version.user_id):
+                raise AccessDeniedError()
+            conditional.check(entity_etag(version.id, version.updated_at))
+
+    async def load():
+        task = (await db.scalars(select(Task).filter(Task.id == task_id))).first()
+        if task is None:
+            # Archived tasks stay readable by id
+            task = (await db.scalars(select(TaskArchive).filter(TaskArchive.id == task_id))).first()
+        return task
+    task = await entity_cache.get_or_load(Task, task_id, load)
     if not task:
         raise ResourceNotFoundError("Task not found")
     if not user.is_admin and user.sub != str(task.user_id):
         raise AccessDeniedError()
+    if conditional:
+        conditional.etag = entity_etag(task.id, task.updated_at)
     return task
 
-async def search_tasks(request: TaskSearchModel, db: AsyncSession, user: UserClaims) -> list[Task]:
+async def get_task_stats(db: AsyncSession, user: UserClaims, user_id: Optional[UUID] = None) -> dict:
+    # Admins see everyone's tasks unless they pick a user; other users only their own
+    if not user.is_admin:
+        if user_id and user.sub != str(user_id):
+            raise AccessDeniedError()
+        user_id = UUID(user.sub)
+    return await read_task_stats(db, user_id)
+
+async def search_tasks(request: TaskSearchModel, db: AsyncSession, user: UserClaims,
+                       conditional: Optional[ConditionalRequest] = None) -> list[Task] | dict:
     if request.user_id and not user.is_admin and user.sub != str(request.user_id):
         raise BusinessRuleViolationError("You are not allowed to search tasks for this user")
-    query = select(Task)
-    conditions = [
-        Task.summary.ilike(f"%{request.summary}%") if request.summary else None,
-        Task.description.ilike(f"%{request.description}%") if request.description else None,
-        Task.status == request.status if request.status else None,
-        Task.priority == request.priority if request.priority else None,
-        Task.user_id == request.user_id if request.user_id else None,
-    ]
-    query = query.where(*[cond for cond in conditions if cond is not None])
-
-    if request.order_by:
-        if request.order_by and request.order_by in Task.get_sortable_fields():
-            order_column = getattr(Task, request.order_by)
-            query = query.order_by(order_column.desc() if request.order_direction == 'desc' else order_column)
-        else:
-            raise InvalidInputError("Invalid sort field")
-
-    if request.page and request.page_size:
-        query = query.offset((request.page - 1) * request.page_size).limit(request.page_size)
-    result = await db.scalars(query)
-    return result.all()
+    text_filters = {"summary": request.summary, "description": request.description}
+    filters = {"status": request.status, "priority": request.priority, "user_id": request.user_id}
+
+    # The archive is only scanned on request, so the default search stays on the hot table
+    entity = TaskWithArchive if request.include_archived else Task
+
+    async def load(session: AsyncSession, conditional: ConditionalRequest):
+        return await execute_search(session, entity, request, text_filters, filters,
+                                    facet_columns={"status": entity.status, "priority": entity.priority}, conditional=conditional)
+    key = search_key(entity, "admin" if user.is_admin else user.sub, request, text_filters, filters)
+    # Tagged as tasks either way, so task writes invalidate archive-inclusive searches too
+    return await search_cache.get_or_load(db, entity, key, search_tags(Task, filters, ("user_id",)), load, conditional)
 
 
 def validate_task_params(func: Callable[..., Any]) -> Callable[..., Any]:
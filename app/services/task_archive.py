@@ -0,0 +1,71 @@
+""" Hot/cold split of the tasks table
+
+Completed tasks that have not been updated for ``TASK_ARCHIVE_AFTER_DAYS``
+move to ``tasks_archive``, partitioned by the year of their last update. The
+hot table and its indexes then only hold the tasks that are still being
+worked on. Each batch moves rows with a single DELETE ... RETURNING feeding an
+INSERT and commits on its own. Locks stay short, and an interrupted run
+loses nothing. The task stats keep counting archived tasks, and an archived
+task is still readable by id and through ``include_archived`` searches.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.entities.base_entity import TaskStatus
+from app.entities.task import Task
+from app.services.utils import get_current_utc_time
+
+TASK_COLUMNS = ", ".join(Task.__table__.columns.keys())
+
+MOVE_BATCH = text(f"""
+    WITH moved AS (
+        DELETE FROM tasks
+        WHERE id IN (
+            SELECT id FROM tasks
+            WHERE status = 'COMPLETED' AND updated_at < :cutoff
+              -- tasks.description is text, the archive's varchar(255); a longer one would fail the whole batch
+              AND (description IS NULL OR length(description) <= 255)
+            ORDER BY updated_at
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {TASK_COLUMNS}
+    )
+    INSERT INTO tasks_archive ({TASK_COLUMNS})
+    SELECT {TASK_COLUMNS} FROM moved
+""")
+
+
+def archive_cutoff(after_days: int) -> datetime:
+    return get_current_utc_time() - timedelta(days=after_days)
+
+async def ensure_archive_partitions(db: AsyncSession, cutoff: datetime) -> None:
+    """Create the yearly partitions the tasks to archive before ``cutoff`` will land in."""
+    oldest = await db.scalar(
+        select(func.min(Task.updated_at)).where(Task.status == TaskStatus.COMPLETED, Task.updated_at < cutoff)
+    )
+    if oldest is None:
+        return
+    for year in range(oldest.year, cutoff.year + 1):
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS tasks_archive_y{year} PARTITION OF tasks_archive "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+    await db.commit()
+
+async def archive_tasks(db: AsyncSession, after_days: int, batch_size: int, max_batches: int = 0) -> int:
+    """Move completed tasks older than ``after_days`` to the archive; returns the number moved."""
+    cutoff = archive_cutoff(after_days)
+    await ensure_archive_partitions(db, cutoff)
+    moved = 0
+    batches = 0
+    while not max_batches or batches < max_batches:
+        result = await db.execute(MOVE_BATCH, {"cutoff": cutoff, "batch_size": batch_size})
+        await db.commit()
+        moved += result.rowcount
+        batches += 1
+        if result.rowcount < batch_size:
+            break
+    return moved
@@ -0,0 +1,91 @@
+""" Per-user IN_PROGRESS task counters
+
+``user_task_counters`` holds one row per user with the number of IN_PROGRESS
+tasks. Every change runs in the caller's transaction and goes through a
+single-row upsert or update. The row lock serializes concurrent requests for
+the same user, so the "at most N in progress" rule holds without counting
+tasks.
+"""
+from uuid import UUID
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.entities.base_entity import TaskStatus
+from app.entities.task import Task
+from app.entities.user_task_counter import UserTaskCounter
+from app.services.exception import BusinessRuleViolationError
+
+MAX_IN_PROGRESS_TASKS = 2
+
+
+async def reserve_in_progress_slot(db: AsyncSession, user_id: UUID) -> None:
+    statement = insert(UserTaskCounter).values(user_id=user_id, in_progress_count=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserTaskCounter.user_id],
+        set_={"in_progress_count": UserTaskCounter.in_progress_count + 1},
+        where=UserTaskCounter.in_progress_count < MAX_IN_PROGRESS_TASKS,
+    ).returning(UserTaskCounter.in_progress_count)
+    if (await db.execute(statement)).scalar() is None:
+        raise BusinessRuleViolationError(f"User can have only {MAX_IN_PROGRESS_TASKS} in progress tasks")
+
+async def release_in_progress_slot(db: AsyncSession, user_id: UUID) -> None:
+    await db.execute(
+        update(UserTaskCounter)
+        .where(UserTaskCounter.user_id == user_id, UserTaskCounter.in_progress_count > 0)
+        .values(in_progress_count=UserTaskCounter.in_progress_count - 1)
+    )
+
+async def move_in_progress_slot(db: AsyncSession, old_user_id, was_in_progress: bool,
+                                new_user_id, is_in_progress: bool) -> None:
+    """Apply a task's status/owner change to the counters."""
+    same_owner = old_user_id == new_user_id
+    if was_in_progress and old_user_id and not (is_in_progress and same_owner):
+        await release_in_progress_slot(db, old_user_id)
+    if is_in_progress and new_user_id and not (was_in_progress and same_owner):
+        await reserve_in_progress_slot(db, new_user_id)
+
+async def lock_in_progress_counts(db: AsyncSession, user_ids: set) -> dict:
+    """Lock the counter rows of ``user_ids`` for the transaction and return their counts."""
+    if not user_ids:
+        return {}
+    await db.execute(
+        insert(UserTaskCounter)
+        .values([{"user_id": user_id, "in_progress_count": 0} for user_id in user_ids])
+        .on_conflict_do_nothing(index_elements=[UserTaskCounter.user_id])
+    )
+    rows = await db.execute(
+        select(UserTaskCounter.user_id, UserTaskCounter.in_progress_count)
+        .where(UserTaskCounter.user_id.in_(user_ids))
+        .with_for_update()
+    )
+    return dict(rows.all())
+
+async def add_in_progress_counts(db: AsyncSession, increments: dict) -> None:
+    for user_id, increment in increments.items():
+        if increment:
+            await db.execute(
+                update(UserTaskCounter)
+                .where(UserTaskCounter.user_id == user_id)
+                .values(in_progress_count=UserTaskCounter.in_progress_count + increment)
+            )
+
+async def rebuild_task_counters(db: AsyncSession) -> int:
+    """Recompute every counter from the tasks table; returns the number of users with active tasks."""
+    # EXCLUSIVE blocks concurrent counter writes (and so task status changes) until commit
+    await db.execute(text("LOCK TABLE user_task_counters IN EXCLUSIVE MODE"))
+    await db.execute(update(UserTaskCounter).values(in_progress_count=0))
+    counts = (
+        select(Task.user_id, func.count())
+        .where(Task.status == TaskStatus.IN_PROGRESS, Task.user_id.isnot(None))
+        .group_by(Task.user_id)
+    )
+    statement = insert(UserTaskCounter).from_select(["user_id", "in_progress_count"], counts)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserTaskCounter.user_id],
+        set_={"in_progress_count": statement.excluded.in_progress_count},
+    )
+    result = await db.execute(statement)
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,171 @@
+""" Live task change feed
+
+A trigger on ``tasks`` publishes every insert and update on the
+``task_changes`` channel. Each worker holds one dedicated LISTEN connection to
+the primary (NOTIFY does not reach replicas), opened when the first subscriber
+arrives, and fans the events out to the subscribers' queues.
+
+A subscriber sees the events ``get_task`` would let it read: admins every task,
+other users the tasks they own. A task moved away from a user reaches them once
+as a ``removed`` event. Notifications sent while the listener is disconnected
+are lost, so every subscriber gets a ``reset`` event whenever the listener
+(re)connects, and one on subscribing if it is already connected. A client
+refetches its tasks on ``reset`` and applies the events that follow.
+
+The token is only checked when the stream opens, so the stream ends with an
+``expired`` event at the token's ``exp``; the client reconnects with a fresh
+token.
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.engine import make_url
+
+from app.models.user import UserClaims
+from app.settings import (
+    SQLALCHEMY_DATABASE_URL_ASYNC, TASK_FEED_QUEUE_SIZE, TASK_FEED_KEEPALIVE_SECONDS, TASK_FEED_RETRY_SECONDS,
+)
+
+CHANNEL = "task_changes"
+RESET = {"op": "reset"}
+OVERFLOW = {"op": "overflow"}
+EXPIRED = {"op": "expired"}
+
+
+def listen_dsn() -> str:
+    # asyncpg takes a plain postgresql:// DSN, without SQLAlchemy's driver suffix
+    return make_url(SQLALCHEMY_DATABASE_URL_ASYNC).set(drivername="postgresql").render_as_string(hide_password=False)
+
+def visible_event(user: UserClaims, event: dict) -> Optional[dict]:
+    if user.is_admin or user.sub == event.get("user_id"):
+        return event
+    if event.get("old_user_id") is not None and user.sub == event["old_user_id"]:
+        return {"op": "removed", "id": event["id"]}
+    return None
+
+
+class Subscription:
+    def __init__(self, user: UserClaims, queue_size: int) -> None:
+        self.user = user
+        self.queue = asyncio.Queue(queue_size)
+        self.closed = False
+
+    def offer(self, event: dict) -> bool:
+        """Queue ``event``; a subscriber that falls ``queue_size`` events behind is closed."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # Drop the backlog for a final overflow event rather than buffer without bound
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            self.closed = True
+            return False
+
+
+class TaskFeed:
+    def __init__(self, queue_size: int, keepalive: float, retry_after: float) -> None:
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.retry_after = retry_after
+        self.subscribers: set[Subscription] = set()
+        self.connected = False
+        self._listener: Optional[asyncio.Task] = None
+        self.counts = {"received": 0, "delivered": 0, "overflows": 0, "reconnects": 0}
+
+    def subscribe(self, user: UserClaims) -> Subscription:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        subscription = Subscription(user, self.queue_size)
+        self.subscribers.add(subscription)
+        if self.connected:
+            subscription.offer(RESET)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def publish(self, event: dict) -> None:
+        self.counts["received"] += 1
+        for subscription in list(self.subscribers):
+            visible = event if event is RESET else visible_event(subscription.user, event)
+            if visible is None:
+                continue
+            if subscription.offer(visible):
+                self.counts["delivered"] += 1
+            elif subscription.closed:
+                self.counts["overflows"] += 1
+                self.unsubscribe(subscription)
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        self.publish(json.loads(payload))
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        while True:
+            try:
+                connection = await asyncpg.connect(listen_dsn())
+            except (OSError, asyncpg.PostgresError):
+                await asyncio.sleep(self.retry_after)
+                continue
+            terminated = asyncio.Event()
+            connection.add_termination_listener(lambda _: terminated.set())
+            try:
+                await connection.add_listener(CHANNEL, self._on_notification)
+                self.connected = True
+                self.publish(RESET)
+                while not terminated.is_set():
+                    try:
+                        await asyncio.wait_for(terminated.wait(), self.keepalive)
+                    except asyncio.TimeoutError:
+                        # A dead peer is only noticed on a write, so probe the idle connection
+                        await connection.execute("SELECT 1")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                pass
+            finally:
+                self.connected = False
+                if not connection.is_closed():
+                    connection.terminate()
+            self.counts["reconnects"] += 1
+            await asyncio.sleep(self.retry_after)
+
+    async def events(self, user: UserClaims) -> AsyncIterator[str]:
+        """Server-sent events for ``user``, with a comment line every ``keepalive`` seconds of silence."""
+        subscription = self.subscribe(user)
+        try:
+            while True:
+                remaining = user.exp - time.time()
+                if remaining <= 0:
+                    yield f"event: {EXPIRED['op']}\ndata: {json.dumps(EXPIRED)}\n\n"
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), min(self.keepalive, remaining))
+                except asyncio.TimeoutError:
+                    if remaining > self.keepalive:
+                        yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['op']}\ndata: {json.dumps(event)}\n\n"
+                if event is OVERFLOW:
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> dict:
+        return {"connected": self.connected, "subscribers": len(self.subscribers), **self.counts}
+
+task_feed = TaskFeed(TASK_FEED_QUEUE_SIZE, TASK_FEED_KEEPALIVE_SECONDS, TASK_FEED_RETRY_SECONDS)
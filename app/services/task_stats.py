@@ -0,0 +1,79 @@
+""" Task counts per user, status and priority
+
+``task_stats`` holds one row per (user, status, priority) group with the
+number of tasks in it, archived ones included. TaskService applies the delta of every create and
+update in the same transaction. Dashboards therefore read at most one row
+per group and user, however many tasks there are. Company stats join the
+company's users, so moving a user to another company needs no bookkeeping.
+"""
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.entities.task_archive import TaskWithArchive
+from app.entities.task_stat import TaskStat
+from app.entities.user import User
+
+
+def task_stats_key(task) -> tuple:
+    return task.user_id, task.status, task.priority
+
+async def apply_task_stats(db: AsyncSession, deltas: dict) -> None:
+    """Add ``deltas`` ({task_stats_key: change}) to the groups with one upsert."""
+    rows = [
+        {"user_id": user_id, "status": status, "priority": priority, "task_count": delta}
+        for (user_id, status, priority), delta in deltas.items()
+        if delta and user_id is not None
+    ]
+    if not rows:
+        return
+    # A fixed row order makes concurrent upserts lock the groups in the same order
+    rows.sort(key=lambda row: (str(row["user_id"]), row["status"].value, row["priority"].value))
+    statement = insert(TaskStat).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TaskStat.user_id, TaskStat.status, TaskStat.priority],
+        set_={"task_count": TaskStat.task_count + statement.excluded.task_count},
+    )
+    await db.execute(statement)
+
+def _stats_query():
+    return (
+        select(TaskStat.status, TaskStat.priority, func.sum(TaskStat.task_count))
+        .group_by(TaskStat.status, TaskStat.priority)
+        .order_by(TaskStat.status, TaskStat.priority)
+    )
+
+async def _read_stats(db: AsyncSession, query) -> dict:
+    groups = [
+        {"status": status, "priority": priority, "count": count}
+        for status, priority, count in (await db.execute(query)).all()
+        if count
+    ]
+    return {"total": sum(group["count"] for group in groups), "groups": groups}
+
+async def read_task_stats(db: AsyncSession, user_id: Optional[UUID] = None) -> dict:
+    query = _stats_query()
+    if user_id:
+        query = query.where(TaskStat.user_id == user_id)
+    return await _read_stats(db, query)
+
+async def read_company_task_stats(db: AsyncSession, company_id: UUID) -> dict:
+    query = _stats_query().join(User, User.id == TaskStat.user_id).where(User.company_id == company_id)
+    return await _read_stats(db, query)
+
+async def rebuild_task_stats(db: AsyncSession) -> int:
+    """Recompute every group from the live and archived tasks; returns the number of groups."""
+    # EXCLUSIVE blocks concurrent stats writes (and so task writes) until commit
+    await db.execute(text("LOCK TABLE task_stats IN EXCLUSIVE MODE"))
+    await db.execute(delete(TaskStat))
+    groups = (
+        select(TaskWithArchive.user_id, TaskWithArchive.status, TaskWithArchive.priority, func.count())
+        .where(TaskWithArchive.user_id.isnot(None))
+        .group_by(TaskWithArchive.user_id, TaskWithArchive.status, TaskWithArchive.priority)
+    )
+    result = await db.execute(insert(TaskStat).from_select(["user_id", "status", "priority", "task_count"], groups))
+    await db.commit()
+    return result.rowcount
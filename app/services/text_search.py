@@ -0,0 +1,54 @@
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import Select, func
+
+from app.services.exception import InvalidInputError
+
+
+class SearchMode(Enum):
+    # Substring match; served by the pg_trgm GIN indexes for terms of 3+ characters
+    CONTAINS = "contains"
+    # Prefix match on the beginning of the column value
+    PREFIX = "prefix"
+    # Fuzzy word similarity (pg_trgm ``%>`` operator), tolerant to typos
+    SIMILAR = "similar"
+
+
+def parse_search_mode(value: Optional[str]) -> SearchMode:
+    if value is None:
+        return SearchMode.CONTAINS
+    try:
+        return SearchMode(value.lower())
+    except ValueError:
+        raise InvalidInputError("Invalid search mode")
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def text_pattern(term: str, mode: SearchMode) -> str:
+    """The value text_condition() compares against for ``term``."""
+    if mode == SearchMode.SIMILAR:
+        return term
+    if mode == SearchMode.PREFIX:
+        return f"{escape_like(term)}%"
+    return f"%{escape_like(term)}%"
+
+def text_condition(column, pattern, mode: SearchMode):
+    # ``pattern`` is a text_pattern() value or a bind parameter that will carry one
+    if mode == SearchMode.SIMILAR:
+        return column.op("%>")(pattern)
+    return column.ilike(pattern, escape="\\")
+
+def relevance(text_filters: list[tuple]):
+    """Sum of the trigram word similarity of the given (column, term) pairs, or None."""
+    scores = [func.word_similarity(term, column) for column, term in text_filters]
+    if not scores:
+        return None
+    return sum(scores[1:], scores[0])
+
+def order_by_relevance(query: Select, text_filters: list[tuple]) -> Select:
+    score = relevance(text_filters)
+    if score is None:
+        return query
+    return query.order_by(score.desc())
@@ -1,14 +1,24 @@
 from typing import Optional
 from datetime import timedelta
-from uuid import UUID
+import asyncio
+from uuid import UUID, uuid4
 import jwt
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.settings import JWT_ALGORITHM, JWT_SECRET, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-from app.entities.user import User, verify_password, get_password_hash
-from app.services.utils import get_current_utc_time, get_current_timestamp
-from app.models.user import UserModel, UserUpdateModel, UserSearchModel, UserClaims
+from app.settings import JWT_ALGORITHM, JWT_SECRET, JWT_ACCESS_TOKEN_EXPIRE_MINUTES, BULK_MAX_ITEMS, BULK_INSERT_BATCH_SIZE
+from app.entities.user import User
+from app.services.password import hash_password, check_password, password_hash_pool
+from app.services.utils import get_current_utc_time, get_current_timestamp, chunked, integrity_error_code, FOREIGN_KEY_VIOLATION
+from app.services.export import stream_export
+from app.services.entity_cache import entity_cache
+from app.services.search_cache import search_cache, search_key, search_tags
+from app.services.search import execute_search
+from app.services.etag import ConditionalRequest, entity_etag, entity_version, query_etag, rows_etag
+from app.models.user import UserModel, UserResponseModel, UserUpdateModel, UserSearchModel, UserClaims
 from app.services.exception import BusinessRuleViolationError, ResourceNotFoundError, InvalidInputError
 from app.entities.company import Company
 
@@ -26,101 +36,176 @@ def create_access_token(user: User, expires: Optional[int] = None):
     )
     return jwt.encode(claims.model_dump(), JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.scalars(select(User).filter(User.username == username)).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = (await db.scalars(select(User).filter(User.username == username))).first()
 
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await check_password(password, user.hashed_password):
         return False
     return user
 
-def get_all_users(db: Session):
-    return db.scalars(select(User)).all()
+async def get_all_users(db: AsyncSession, conditional: Optional[ConditionalRequest] = None) -> list[User]:
+    query = select(User)
+    if conditional and conditional.if_none_match:
+        conditional.check(await query_etag(db, query))
+    users = (await db.scalars(query)).all()
+    if conditional:
+        conditional.etag = rows_etag(users)
+    return users
 
-def create_user(request: UserModel, db: Session) -> User:
-    existing_user = db.scalars(select(User).filter(User.email == request.email or User.username == request.username)).first()
-    if existing_user:
-        raise BusinessRuleViolationError("User with this email or username already exists")
-    existing_company = db.scalars(select(Company).filter(Company.id == request.company_id)).first()
-    if not existing_company:
-        raise ResourceNotFoundError("Company not found")
+def export_all_users(export_format: str) -> StreamingResponse:
+    return stream_export(select(User), list(UserResponseModel.model_fields), export_format, "users")
+
+async def create_user(request: UserModel, db: AsyncSession) -> User:
     current_time = get_current_utc_time()
-    user = User(
-        username=request.username,
-        email=request.email,
-        first_name=request.first_name,
-        last_name=request.last_name,
-        company_id=request.company_id,
-        created_at=current_time,
-        updated_at=current_time,
-        hashed_password=get_password_hash(request.password)
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    values = {
+        "username": request.username,
+        "email": request.email,
+        "first_name": request.first_name,
+        "last_name": request.last_name,
+        "company_id": request.company_id,
+        "created_at": current_time,
+        "updated_at": current_time,
+        "hashed_password": await hash_password(request.password),
+    }
+    try:
+        user = (await db.scalars(insert(User).values(values).returning(User))).one()
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("Company not found")
+        raise BusinessRuleViolationError("User with this email or username already exists")
+    search_cache.invalidate(User, {"company_id": user.company_id})
     return user
 
-def update_user(user_id: UUID, request: UserUpdateModel, db: Session, logged_in_user: UserClaims) -> User:
-    user_with_update_email = db.scalars(select(User).filter(User.email == request.email and User.id != user_id)).first()
-    if user_with_update_email:
+async def create_users_bulk(requests: list[UserModel], db: AsyncSession) -> list[dict]:
+    if len(requests) > BULK_MAX_ITEMS:
+        raise InvalidInputError(f"At most {BULK_MAX_ITEMS} users can be created at once")
+
+    usernames = {request.username for request in requests}
+    emails = {request.email for request in requests}
+    company_ids = {request.company_id for request in requests}
+    taken = (await db.execute(
+        select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    )).all() if requests else []
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+    existing_company_ids = set((await db.scalars(select(Company.id).where(Company.id.in_(company_ids)))).all()) if company_ids else set()
+
+    results = []
+    accepted = []
+    for index, request in enumerate(requests):
+        if request.username in taken_usernames or request.email in taken_emails:
+            results.append({"index": index, "error": "User with this email or username already exists"})
+            continue
+        if request.company_id not in existing_company_ids:
+            results.append({"index": index, "error": "Company not found"})
+            continue
+        taken_usernames.add(request.username)
+        taken_emails.add(request.email)
+        accepted.append((index, request))
+
+    # Keep at most one hash per worker in flight so a large batch never overflows the pool queue
+    hashed_passwords = []
+    for batch in chunked(accepted, password_hash_pool.max_workers):
+        hashed_passwords.extend(await asyncio.gather(*[hash_password(request.password) for _, request in batch]))
+
+    rows = []
+    current_time = get_current_utc_time()
+    for (index, request), hashed_password in zip(accepted, hashed_passwords):
+        row = {
+            "id": uuid4(),
+            "username": request.username,
+            "email": request.email,
+            "first_name": request.first_name,
+            "last_name": request.last_name,
+            "company_id": request.company_id,
+            "created_at": current_time,
+            "updated_at": current_time,
+            "hashed_password": hashed_password,
+        }
+        rows.append((index, row))
+
+    # The check above races with concurrent inserts; a row that conflicts by now is reported, not raised
+    inserted_ids = set()
+    try:
+        for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+            statement = insert(User).values([row for _, row in batch]).on_conflict_do_nothing().returning(User.id)
+            inserted_ids.update((await db.scalars(statement)).all())
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("Company not found")
+        raise
+    for index, row in rows:
+        if row["id"] in inserted_ids:
+            results.append({"index": index, "id": row["id"]})
+        else:
+            results.append({"index": index, "error": "User with this email or username already exists"})
+    if inserted_ids:
+        search_cache.invalidate(User, {"company_id": {row["company_id"] for _, row in rows if row["id"] in inserted_ids}})
+    return sorted(results, key=lambda result: result["index"])
+
+async def update_user(user_id: UUID, request: UserUpdateModel, db: AsyncSession, logged_in_user: UserClaims) -> User:
+    # Not Admin can not update is_admin, is_active, company_id
+    if not logged_in_user.is_admin and (request.is_admin or request.is_active or request.company_id):
+        raise BusinessRuleViolationError("You are not allowed to update this field")
+    values = {**await map_user_model_to_values(request), "updated_at": get_current_utc_time()}
+    statement = (
+        update(User).where(User.id == user_id).values(values).returning(User)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        existing_user = (await db.scalars(statement)).one_or_none()
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        if integrity_error_code(err) == FOREIGN_KEY_VIOLATION:
+            raise ResourceNotFoundError("Company not found")
         raise BusinessRuleViolationError("User with this email already exists")
-    existing_user = db.scalars(select(User).filter(User.id == user_id)).first()
     if not existing_user:
         raise ResourceNotFoundError("User not found")
-    existing_user.updated_at = get_current_utc_time()
-    if logged_in_user.is_admin:
-        # Admin can update more fields
-        map_user_model_to_user(existing_user, request)
-    else:
-        # Not Admin can not update is_admin, is_active, company_id
-        print(request.is_admin, request.is_active, request.company_id)
-        if request.is_admin or request.is_active or request.company_id:
-            raise BusinessRuleViolationError("You are not allowed to update this field")
-        else:
-            map_user_model_to_user(existing_user, request)
-
-    db.commit()
-    db.refresh(existing_user)
+    await entity_cache.invalidate(User, user_id)
+    # The previous company is unknown here, so moving a user drops every user search
+    search_cache.invalidate(User, None if "company_id" in values else {"company_id": existing_user.company_id})
     return existing_user
 
-def search_users(request: UserSearchModel, db: Session) -> list[User]:
-    query = select(User)
+async def search_users(request: UserSearchModel, db: AsyncSession,
+                       conditional: Optional[ConditionalRequest] = None) -> list[User] | dict:
+    text_filters = {
+        "email": request.email,
+        "username": request.username,
+        "first_name": request.first_name,
+        "last_name": request.last_name,
+    }
+    filters = {"company_id": request.company_id, "is_admin": request.is_admin, "is_active": request.is_active}
 
-    conditions = [
-        User.email.ilike(f"%{request.email}%") if request.email else None,
-        User.username.ilike(f"%{request.username}%") if request.username else None,
-        User.first_name.ilike(f"%{request.first_name}%") if request.first_name else None,
-        User.last_name.ilike(f"%{request.last_name}%") if request.last_name else None,
-        User.company_id == request.company_id if request.company_id else None,
-        User.is_admin == request.is_admin if request.is_admin else None,
-        User.is_active == request.is_active if request.is_active else None,
-    ]
-
-    query = query.where(*[cond for cond in conditions if cond is not None])
-
-    if request.order_by:
-        if request.order_by and request.order_by in User.get_sortable_fields():
-            order_column = getattr(User, request.order_by)
-            query = query.order_by(order_column.desc() if request.order_direction == 'desc' else order_column)
-        else:
-            raise InvalidInputError("Invalid sort field")
+    async def load(session: AsyncSession, conditional: ConditionalRequest):
+        return await execute_search(session, User, request, text_filters, filters, conditional=conditional)
+    # User search is admin-only
+    key = search_key(User, "admin", request, text_filters, filters)
+    return await search_cache.get_or_load(db, User, key, search_tags(User, filters, ("company_id",)), load, conditional)
 
-    if request.page and request.page_size:
-        query = query.offset((request.page - 1) * request.page_size).limit(request.page_size)
-    return db.scalars(query).all()
+async def get_user(user_id: UUID, db: AsyncSession, conditional: Optional[ConditionalRequest] = None) -> User:
+    if conditional and conditional.if_none_match:
+        version = await entity_version(db, User, user_id)
+        if version:
+            conditional.check(entity_etag(version.id, version.updated_at))
 
-def get_user(user_id: UUID, db: Session) -> User:
-    user = db.scalars(select(User).filter(User.id == user_id)).first()
+    async def load():
+        return (await db.scalars(select(User).filter(User.id == user_id))).first()
+    user = await entity_cache.get_or_load(User, user_id, load)
     if not user:
         raise ResourceNotFoundError("User not found")
+    if conditional:
+        conditional.etag = entity_etag(user.id, user.updated_at)
     return user
 
-def map_user_model_to_user(user: User, request: UserModel) -> User:
+async def map_user_model_to_values(request: UserModel) -> dict:
     update_data_dict = request.model_dump(exclude_unset=True)
-    for field, value in update_data_dict.items():
-        if field == 'password':
-            setattr(user, 'hashed_password', get_password_hash(value))
-        else:
-            setattr(user, field, value)
-    return user
+    if 'password' in update_data_dict:
+        update_data_dict['hashed_password'] = await hash_password(update_data_dict.pop('password'))
+    return update_data_dict
@@ -1,8 +1,45 @@
 from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Optional
+from uuid import UUID
 import time
 
+# SQLSTATE of a foreign key violation, which write paths translate into a not found error
+FOREIGN_KEY_VIOLATION = "23503"
+
 def get_current_utc_time() -> datetime:
-    return datetime.now(timezone.utc)
+    # Naive UTC: created_at/updated_at are TIMESTAMP WITHOUT TIME ZONE, which asyncpg
+    # refuses to bind an aware datetime to
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 def get_current_timestamp() -> int:
     return int(time.time())
+
+def chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def dump_column_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+def load_column_value(column, value: Any) -> Any:
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if issubclass(python_type, Enum):
+        return python_type[value]
+    if issubclass(python_type, datetime):
+        return datetime.fromisoformat(value)
+    if issubclass(python_type, UUID):
+        return UUID(value)
+    return value
+
+def integrity_error_code(error) -> Optional[str]:
+    """SQLSTATE of an IntegrityError, for asyncpg and psycopg2 alike."""
+    return getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
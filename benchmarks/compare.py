@@ -0,0 +1,51 @@
+""" Compare two benchmark result files
+
+Usage:
+
+    python -m benchmarks.compare bench-old.json bench-new.json [--threshold 10]
+
+Exits with status 1 when any benchmark's p50 or p99 regressed by more than
+the threshold (in percent).
+"""
+import argparse
+import json
+import sys
+
+
+def _delta(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> bool:
+    old_results = {result["name"]: result for result in baseline["results"]}
+    regressed = False
+    print(f"baseline {baseline['revision']}  ->  candidate {candidate['revision']}")
+    print(f"{'benchmark':<40} {'p50 ms':>18} {'Δp50':>8} {'p99 ms':>18} {'Δp99':>8} {'Δbytes/call':>12}")
+    for result in candidate["results"]:
+        old = old_results.get(result["name"])
+        if old is None:
+            print(f"{result['name']:<40} {'(new)':>18}")
+            continue
+        p50_delta = _delta(old["p50_ms"], result["p50_ms"])
+        p99_delta = _delta(old["p99_ms"], result["p99_ms"])
+        bytes_delta = result["retained_bytes_per_call"] - old["retained_bytes_per_call"]
+        flag = ""
+        if p50_delta > threshold or p99_delta > threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"{result['name']:<40} {old['p50_ms']:>8.3f}->{result['p50_ms']:<8.3f} {p50_delta:>+7.1f}% "
+              f"{old['p99_ms']:>8.3f}->{result['p99_ms']:<8.3f} {p99_delta:>+7.1f}% {bytes_delta:>+12}{flag}")
+    return regressed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        regressed = compare(json.load(baseline), json.load(candidate), args.threshold)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
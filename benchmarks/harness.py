@@ -0,0 +1,87 @@
+""" Timing and allocation measurement for benchmark cases
+"""
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+async def measure(name: str, fn: Callable[[], Awaitable[object]], iterations: int, warmup: int) -> dict:
+    """Run ``fn`` repeatedly and report latency percentiles and allocations per call.
+
+    Allocations are measured in a separate pass, because tracemalloc slows
+    down every allocation and would distort the timings.
+    """
+    for _ in range(warmup):
+        await fn()
+
+    gc.collect()
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started_at) * 1000)
+
+    alloc_iterations = max(1, min(iterations, 20))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(alloc_iterations):
+        await fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+
+    return {
+        "name": name,
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p90_ms": round(percentile(samples, 90), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "max_ms": round(max(samples), 4),
+        "retained_bytes_per_call": allocated // alloc_iterations,
+        "retained_blocks_per_call": blocks // alloc_iterations,
+        "peak_traced_bytes": peak,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def write_results(path: str, results: list[dict], config: dict) -> None:
+    document = {
+        "revision": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as output:
+        json.dump(document, output, indent=2)
+
+def print_results(results: list[dict]) -> None:
+    print(f"{'benchmark':<40} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'bytes/call':>12}")
+    for result in results:
+        print(f"{result['name']:<40} {result['p50_ms']:>10.3f} {result['p90_ms']:>10.3f} "
+              f"{result['p99_ms']:>10.3f} {result['retained_bytes_per_call']:>12}")
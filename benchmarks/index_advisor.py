@@ -0,0 +1,322 @@
+""" Index advisor and query plan checks for the search endpoints
+
+Usage (from the repository root, against a migrated local database):
+
+    python -m benchmarks.index_advisor --seed-tasks 100000
+    python -m benchmarks.index_advisor --generate-migration
+    python -m benchmarks.index_advisor --check
+
+Every filter and sort combination ``search_tasks``, ``search_companies`` and
+``search_users`` can build is run through the service, in both offset and
+cursor paging. The SQL the service executed is captured and EXPLAINed.
+Sequential scans of large tables and sorts of many rows are flagged. A
+flagged plan recommends a btree index: the equality filter columns, then the
+sort column, then ``id`` for keyset paging. Text filters are left to the
+trigram indexes.
+
+``--check`` exits with status 1 while a flagged plan recommends an index the
+database does not have yet, so it can run in CI after ``alembic upgrade head``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import secrets
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event, select, text
+
+from benchmarks.seed import seed
+
+VERSIONS_DIR = Path(__file__).resolve().parent.parent / "app" / "alembic" / "versions"
+PAGE_SIZE = 20
+
+EXISTING_INDEXES = text("""
+    SELECT t.relname, array_agg(a.attname ORDER BY k.ord)
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE t.relname = ANY(:tables) AND i.indpred IS NULL
+    GROUP BY i.indexrelid, t.relname
+""")
+TABLE_ROWS = text("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(:tables) AND relkind IN ('r', 'p')")
+
+
+def search_targets(values: dict) -> list[dict]:
+    """The search services with their text filters, equality filters and a value to filter on."""
+    from app.entities.base_entity import CompanyMode, Rating, TaskPriority, TaskStatus
+    from app.entities.company import Company
+    from app.entities.task import Task
+    from app.entities.user import User
+    from app.models.company import CompanySearchModel
+    from app.models.task import TaskSearchModel
+    from app.models.user import UserSearchModel
+    from app.services import company as CompanyService, task as TaskService, user as UserService
+
+    return [
+        {
+            "entity": Task,
+            "model": TaskSearchModel,
+            "text": {"summary": "report", "description": "report"},
+            "filters": {"status": TaskStatus.IN_PROGRESS, "priority": TaskPriority.HIGH, "user_id": values["user_id"]},
+            "search": lambda request, db, admin: TaskService.search_tasks(request, db, admin),
+        },
+        {
+            "entity": Company,
+            "model": CompanySearchModel,
+            "text": {"name": "bench", "description": "bench"},
+            "filters": {"mode": CompanyMode.ACTIVE, "rating": Rating.FIVE},
+            "search": lambda request, db, admin: CompanyService.search_companies(request, db),
+        },
+        {
+            "entity": User,
+            "model": UserSearchModel,
+            "text": {"email": "bench", "username": "bench", "first_name": "re", "last_name": "re"},
+            "filters": {"company_id": values["company_id"], "is_admin": True, "is_active": True},
+            "search": lambda request, db, admin: UserService.search_users(request, db),
+        },
+    ]
+
+def combinations(target: dict):
+    """(text filter, equality filters, order_by, paging) for every shape the service can build.
+
+    Text filters are taken one at a time, and only ascending sorts are listed,
+    since a btree serves both directions.
+    """
+    entity = target["entity"]
+    filter_subsets = itertools.chain.from_iterable(
+        itertools.combinations(target["filters"], size) for size in range(len(target["filters"]) + 1)
+    )
+    sorts = [None, *sorted(entity.get_sortable_fields())]
+    for filters, text_filter, order_by, paging in itertools.product(
+            list(filter_subsets), [None, *target["text"]], sorts, ("offset", "cursor")):
+        yield text_filter, filters, order_by, paging
+
+def build_request(target: dict, text_filter, filters: tuple, order_by, paging: str, cursor=None):
+    fields = {name: target["filters"][name] for name in filters}
+    if text_filter:
+        fields[text_filter] = target["text"][text_filter]
+    fields.update(order_by=order_by, page_size=PAGE_SIZE)
+    if paging == "cursor":
+        fields["cursor"] = cursor or ""
+    else:
+        fields["page"] = 1
+    return target["model"](**fields)
+
+def recommendation(filters: tuple, order_by, paging: str) -> tuple:
+    columns = list(filters)
+    # A sort on a column that is also filtered on adds nothing to the index
+    if order_by and order_by not in filters:
+        columns.append(order_by)
+    if paging == "cursor" and columns:
+        columns.append("id")
+    return tuple(dict.fromkeys(columns))
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+def plan_issues(plan: dict, table_rows: dict, min_rows: int) -> list[str]:
+    issues = []
+    for node in plan_nodes(plan):
+        if node["Node Type"] == "Seq Scan" and table_rows.get(node.get("Relation Name"), 0) >= min_rows:
+            issues.append(f"seq scan on {node['Relation Name']}")
+        elif node["Node Type"] == "Sort":
+            sorted_rows = sum(child.get("Plan Rows", 0) for child in node.get("Plans", []))
+            if sorted_rows >= min_rows:
+                issues.append(f"sort of ~{sorted_rows} rows")
+    return issues
+
+def covered(columns: tuple, equalities: int, indexes: list[tuple]) -> bool:
+    """Whether an index starts with ``columns``; the first ``equalities`` may come in any order."""
+    return any(
+        len(index) >= len(columns) and set(index[:equalities]) == set(columns[:equalities])
+        and tuple(index[equalities:len(columns)]) == columns[equalities:]
+        for index in indexes
+    )
+
+def collapse(recommended: dict) -> dict:
+    """Drop recommendations that are a prefix of another one on the same table."""
+    kept = {}
+    for (table, columns), shapes in recommended.items():
+        longer = [other for (other_table, other) in recommended
+                  if other_table == table and len(other) > len(columns) and other[:len(columns)] == columns]
+        target = (table, max(longer, key=len)) if longer else (table, columns)
+        kept.setdefault(target, []).extend(shapes)
+    return kept
+
+
+async def analyze(args) -> dict:
+    from app.database import AsyncSessionLocal, init_async_engine, dispose_engines
+    from app.entities.task import Task
+    from app.entities.user import User
+    from app.models.user import UserClaims
+    from app.services.search_cache import search_cache
+
+    engine = init_async_engine()
+    # Every combination has to reach the database
+    search_cache.max_size = 0
+    admin = UserClaims(sub="index-advisor", is_admin=True, iat=0, exp=0)
+
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+
+    async with AsyncSessionLocal() as db:
+        if args.analyze:
+            for table in ("tasks", "companies", "users"):
+                await db.execute(text(f"ANALYZE {table}"))
+            await db.commit()
+        values = {
+            "user_id": await db.scalar(select(Task.user_id).where(Task.user_id.isnot(None)).limit(1)),
+            "company_id": await db.scalar(select(User.company_id).where(User.company_id.isnot(None)).limit(1)),
+        }
+        targets = search_targets(values)
+        tables = [target["entity"].__tablename__ for target in targets]
+        table_rows = dict((await db.execute(TABLE_ROWS, {"tables": tables})).all())
+        indexes = {}
+        for table, columns in (await db.execute(EXISTING_INDEXES, {"tables": tables})).all():
+            indexes.setdefault(table, []).append(tuple(columns))
+
+        report = []
+        recommended = {}
+        for target in targets:
+            table = target["entity"].__tablename__
+            for text_filter, filters, order_by, paging in combinations(target):
+                request = build_request(target, text_filter, filters, order_by, paging)
+                result = await target["search"](request, db, admin)
+                if paging == "cursor" and result["next_cursor"]:
+                    # The second page carries the keyset condition the first one lacks
+                    request = build_request(target, text_filter, filters, order_by, paging, result["next_cursor"])
+                    captured.clear()
+                    await target["search"](request, db, admin)
+                statement, parameters = captured[-1]
+                captured.clear()
+                connection = await db.connection()
+                plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                await db.rollback()
+                captured.clear()
+
+                issues = plan_issues(plan[0]["Plan"], table_rows, args.min_rows)
+                shape = {
+                    "table": table, "text": text_filter, "filters": list(filters), "order_by": order_by,
+                    "paging": paging, "cost": plan[0]["Plan"]["Total Cost"], "issues": issues,
+                }
+                columns = recommendation(filters, order_by, paging)
+                if issues and columns and not covered(columns, len(filters), indexes.get(table, [])):
+                    shape["recommended"] = list(columns)
+                    recommended.setdefault((table, columns), []).append(shape)
+                report.append(shape)
+
+    event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    await dispose_engines()
+
+    ranked = sorted(collapse(recommended).items(), key=lambda item: -len(item[1]))
+    return {
+        "table_rows": table_rows,
+        "shapes": report,
+        "recommendations": [{"table": table, "columns": list(columns), "shapes": len(shapes)}
+                            for (table, columns), shapes in ranked],
+    }
+
+def head_revision() -> str:
+    revisions, parents = set(), set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        source = path.read_text()
+        revision = re.search(r"^revision: str = '(\w+)'", source, re.MULTILINE)
+        parent = re.search(r"^down_revision: Union\[str, None\] = '(\w+)'", source, re.MULTILINE)
+        if revision:
+            revisions.add(revision.group(1))
+        if parent:
+            parents.add(parent.group(1))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"Expected one alembic head, found {sorted(heads)}")
+    return heads.pop()
+
+def index_name(table: str, columns: list) -> str:
+    # Postgres truncates identifiers to 63 bytes
+    return f"idx_{table}_{'_'.join(columns)}"[:63]
+
+def write_migration(recommendations: list[dict]) -> Path:
+    revision = secrets.token_hex(6)
+    down_revision = head_revision()
+    indexes = [(index_name(item["table"], item["columns"]), item["table"], item["columns"]) for item in recommendations]
+    created = "\n".join(f"    op.create_index({name!r}, {table!r}, {columns!r})" for name, table, columns in indexes)
+    dropped = "\n".join(f"    op.drop_index({name!r}, table_name={table!r})" for name, table, _ in reversed(indexes))
+    path = VERSIONS_DIR / f"{revision}_add_advised_search_indexes.py"
+    path.write_text(f'''"""Add advised search indexes
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {datetime.now()}
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '{revision}'
+down_revision: Union[str, None] = '{down_revision}'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Generated by benchmarks.index_advisor
+def upgrade() -> None:
+{created}
+
+
+def downgrade() -> None:
+{dropped}
+''')
+    return path
+
+def print_report(result: dict, verbose: bool) -> None:
+    flagged = [shape for shape in result["shapes"] if shape["issues"]]
+    print(f"{len(result['shapes'])} search shapes, {len(flagged)} flagged (table rows: {result['table_rows']})")
+    for shape in flagged if verbose else [shape for shape in flagged if "recommended" in shape]:
+        filters = ", ".join(filter(None, [shape["text"], *shape["filters"]])) or "-"
+        print(f"  {shape['table']:<10} filters={filters:<40} order_by={shape['order_by'] or '-':<16} "
+              f"{shape['paging']:<7} cost={shape['cost']:<10} {'; '.join(shape['issues'])}")
+    print(f"{len(result['recommendations'])} recommended indexes")
+    for item in result["recommendations"]:
+        print(f"  {item['table']}({', '.join(item['columns'])})  fixes {item['shapes']} shapes")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recommend indexes for the search endpoints from their query plans")
+    parser.add_argument("--seed-tasks", type=int, default=0, help="seed this many benchmark tasks first (0: use the data as is)")
+    parser.add_argument("--min-rows", type=int, default=10000, help="flag seq scans of tables, and sorts, of at least this many rows")
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false", help="skip ANALYZE before planning")
+    parser.add_argument("--max-indexes", type=int, default=8, help="indexes written by --generate-migration")
+    parser.add_argument("--generate-migration", action="store_true", help="write an alembic migration for the recommended indexes")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 while an index is recommended")
+    parser.add_argument("--verbose", action="store_true", help="also list flagged shapes an existing index should serve")
+    parser.add_argument("--output", default=None, help="write the full report as JSON")
+    args = parser.parse_args()
+
+    if args.seed_tasks:
+        seed(args.seed_tasks, max(1, args.seed_tasks // 20), max(1, args.seed_tasks // 1000))
+    result = asyncio.run(analyze(args))
+    print_report(result, args.verbose)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2, default=str)
+    if args.generate_migration and result["recommendations"]:
+        print(f"Migration written to {write_migration(result['recommendations'][:args.max_indexes])}")
+    if args.check and result["recommendations"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
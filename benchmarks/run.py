@@ -0,0 +1,186 @@
+""" Service-layer and router micro-benchmarks
+
+Usage (from the repository root, against a migrated local database):
+
+    python -m benchmarks.run --tasks 100000 --output bench-<revision>.json
+    python -m benchmarks.compare bench-old.json bench-new.json
+
+Router benchmarks go through the ASGI app in-process with httpx, so they
+include routing, dependencies and serialization but no network.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+
+from benchmarks.harness import measure, print_results, write_results
+from benchmarks.seed import BENCH_ADMIN_USERNAME, BENCH_PASSWORD, seed
+
+
+async def service_cases(ids: dict, rng: random.Random) -> tuple[dict, str]:
+    from app.database import AsyncSessionLocal
+    from app.entities.base_entity import TaskStatus
+    from app.models.company import CompanyModel, CompanySearchModel
+    from app.models.task import TaskModel, TaskSearchModel
+    from app.models.user import UserModel, UserSearchModel
+    from app.services import company as CompanyService, task as TaskService, user as UserService
+    from app.services.auth import authorizer
+
+    async with AsyncSessionLocal() as db:
+        admin = await UserService.authenticate_user(BENCH_ADMIN_USERNAME, BENCH_PASSWORD, db)
+        token = UserService.create_access_token(admin)
+    claims = authorizer(token)
+    counter = itertools.count()
+
+    def with_session(call):
+        async def run():
+            async with AsyncSessionLocal() as db:
+                return await call(db)
+        return run
+
+    return {
+        "service.search_tasks.page1": with_session(lambda db: TaskService.search_tasks(
+            TaskSearchModel(summary="report", order_by="created_at", page=1, page_size=50), db, claims)),
+        "service.search_tasks.page100": with_session(lambda db: TaskService.search_tasks(
+            TaskSearchModel(order_by="created_at", page=100, page_size=50), db, claims)),
+        "service.search_tasks.by_user_status": with_session(lambda db: TaskService.search_tasks(
+            TaskSearchModel(status=TaskStatus.IN_PROGRESS, user_id=rng.choice(ids["user_ids"]), page=1, page_size=50), db, claims)),
+        "service.search_companies": with_session(lambda db: CompanyService.search_companies(
+            CompanySearchModel(name="bench", page=1, page_size=50), db)),
+        "service.search_users": with_session(lambda db: UserService.search_users(
+            UserSearchModel(first_name="re", page=1, page_size=50), db)),
+        "service.get_company": with_session(lambda db: CompanyService.get_company(rng.choice(ids["company_ids"]), db)),
+        "service.get_user": with_session(lambda db: UserService.get_user(rng.choice(ids["user_ids"]), db)),
+        "service.create_company": with_session(lambda db: CompanyService.create_company(
+            CompanyModel(name=f"bench company created {next(counter)}", description="created by benchmark"), db)),
+        "service.create_task": with_session(lambda db: TaskService.create_task(
+            TaskModel(summary="bench task", description="created by benchmark", user_id=rng.choice(ids["user_ids"])), db, claims)),
+        "service.create_user": with_session(lambda db: UserService.create_user(
+            UserModel(username=f"bench_created_{next(counter)}", password=BENCH_PASSWORD, first_name="Bench",
+                      last_name="User", email=f"bench_created_{next(counter)}@example.com",
+                      company_id=rng.choice(ids["company_ids"])), db)),
+        "service.authenticate_user": with_session(lambda db: UserService.authenticate_user(
+            BENCH_ADMIN_USERNAME, BENCH_PASSWORD, db)),
+    }, token
+
+async def router_cases(ids: dict, rng: random.Random, token: str, client) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def get(path_factory):
+        async def run():
+            response = await client.get(path_factory(), headers=headers)
+            response.raise_for_status()
+        return run
+
+    async def login():
+        response = await client.post("/auth/token", data={"username": BENCH_ADMIN_USERNAME, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+
+    return {
+        "router.task_search": get(lambda: "/task/search?summary=report&page=1&page_size=50"),
+        "router.task_search.cursor": get(lambda: "/task/search?cursor=&page_size=50&order_by=created_at"),
+        "router.company_search": get(lambda: "/company/search?name=bench&page=1&page_size=50"),
+        "router.user_search": get(lambda: "/user/search?first_name=re&page=1&page_size=50"),
+        "router.get_company": get(lambda: f"/company/{rng.choice(ids['company_ids'])}"),
+        "router.get_user": get(lambda: f"/user/{rng.choice(ids['user_ids'])}"),
+        "router.auth_token": login,
+    }
+
+async def serialization_cases(size: int) -> dict:
+    """Encode one page of rows loaded from the database the way each response path does."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from app.database import AsyncSessionLocal
+    from app.entities.task import Task
+    from app.entities.user import User
+    from app.models.task import TaskResponseModel
+    from app.models.user import UserResponseModel
+    from app.services.serialization import to_content
+
+    # Rows as asyncpg returns them (its own UUID type included), not transient objects
+    async with AsyncSessionLocal() as db:
+        tasks = (await db.scalars(select(Task).limit(size))).all()
+        users = (await db.scalars(select(User).limit(size))).all()
+
+    def validated(rows, model):
+        # What FastAPI does with a response_model: validate from attributes, dump, encode
+        adapter = TypeAdapter(list[model])
+        async def run():
+            JSONResponse(adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json"))
+        return run
+
+    def fast(rows, model):
+        async def run():
+            ORJSONResponse(to_content(rows, model))
+        return run
+
+    async def tasks_untyped():
+        # /task/ and /task/search before they had a response model
+        JSONResponse(jsonable_encoder(tasks))
+
+    return {
+        "serialize.tasks.jsonable_encoder": tasks_untyped,
+        "serialize.tasks.validated": validated(tasks, TaskResponseModel),
+        "serialize.tasks.fast": fast(tasks, TaskResponseModel),
+        "serialize.users.validated": validated(users, UserResponseModel),
+        "serialize.users.fast": fast(users, UserResponseModel),
+    }
+
+async def run(args) -> list[dict]:
+    import httpx
+    from app.database import init_async_engine
+    from app.main import app
+
+    # ASGITransport does not run the lifespan
+    init_async_engine()
+
+    rng = random.Random(args.seed)
+    ids = seed(args.tasks, args.users, args.companies, args.seed)
+    services, token = await service_cases(ids, rng)
+
+    def selected(name: str) -> bool:
+        return not args.filter or args.filter in name
+
+    results = []
+    for name, case in (await serialization_cases(args.serialize_rows)).items():
+        if selected(name):
+            results.append(await measure(name, case, args.iterations, args.warmup))
+    for name, case in services.items():
+        if selected(name):
+            iterations = args.slow_iterations if "authenticate" in name or "create_user" in name else args.iterations
+            results.append(await measure(name, case, iterations, args.warmup))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, case in (await router_cases(ids, rng, token, client)).items():
+            if selected(name):
+                iterations = args.slow_iterations if "auth_token" in name else args.iterations
+                results.append(await measure(name, case, iterations, args.warmup))
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run service and router micro-benchmarks")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=None, help="defaults to tasks / 20")
+    parser.add_argument("--companies", type=int, default=None, help="defaults to tasks / 1000")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--slow-iterations", type=int, default=20, help="iterations for bcrypt-bound cases")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--serialize-rows", type=int, default=500, help="rows per page in the serialization cases")
+    parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+    args.users = args.users or max(1, args.tasks // 20)
+    args.companies = args.companies or max(1, args.tasks // 1000)
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results(args.output, results, config)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
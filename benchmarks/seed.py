@@ -0,0 +1,144 @@
+""" Seed a local database with benchmark data
+
+Usage (from the repository root, against a migrated local database):
+
+    python -m benchmarks.seed --tasks 100000
+"""
+import argparse
+import random
+from collections import Counter
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, select
+
+from app.database import SessionLocal, init_engine
+from app.entities.base_entity import CompanyMode, Rating, TaskStatus, TaskPriority
+from app.entities.company import Company
+from app.entities.task import Task
+from app.entities.task_archive import TaskArchive
+from app.entities.task_stat import TaskStat
+from app.entities.user import User, get_password_hash
+from app.entities.user_task_counter import UserTaskCounter
+from app.services.utils import get_current_utc_time
+
+BENCH_PREFIX = "bench"
+BENCH_ADMIN_USERNAME = "bench_admin"
+BENCH_PASSWORD = "bench-password"
+WORDS = ["alpha", "billing", "report", "deploy", "invoice", "review", "migration", "search",
+         "customer", "release", "database", "backup", "audit", "dashboard", "support"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def clear(db) -> None:
+    bench_users = select(User.id).where(User.username.like(f"{BENCH_PREFIX}%"))
+    # Everything that references the bench users goes first; the benchmarks write tasks too
+    for entity in (TaskStat, UserTaskCounter, TaskArchive, Task):
+        db.execute(delete(entity).where(entity.user_id.in_(bench_users)))
+    db.execute(delete(User).where(User.username.like(f"{BENCH_PREFIX}%")))
+    db.execute(delete(Company).where(Company.name.like(f"{BENCH_PREFIX}%")))
+    db.commit()
+
+def seed(tasks: int, users: int, companies: int, random_seed: int = 42, batch_size: int = 5000) -> dict:
+    init_engine()
+    rng = random.Random(random_seed)
+    now = get_current_utc_time()
+    # One hash for every seeded user; hashing each one would dominate seeding time
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+
+    company_rows = [
+        {
+            "id": uuid4(),
+            "name": f"{BENCH_PREFIX} company {index} {_sentence(rng, 2)}",
+            "description": _sentence(rng, 6),
+            "mode": rng.choice(list(CompanyMode)),
+            "rating": rng.choice(list(Rating)),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for index in range(companies)
+    ]
+    user_rows = [
+        {
+            "id": uuid4(),
+            "username": BENCH_ADMIN_USERNAME if index == 0 else f"{BENCH_PREFIX}_user_{index}",
+            "email": f"{BENCH_PREFIX}_user_{index}@example.com",
+            "first_name": rng.choice(WORDS).title(),
+            "last_name": rng.choice(WORDS).title(),
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_admin": index == 0,
+            "company_id": rng.choice(company_rows)["id"],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for index in range(users)
+    ]
+    task_rows = (
+        {
+            "id": uuid4(),
+            "summary": _sentence(rng, 4),
+            "description": _sentence(rng, 10),
+            "status": rng.choice(list(TaskStatus)),
+            "priority": rng.choice(list(TaskPriority)),
+            "user_id": rng.choice(user_rows)["id"],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for _ in range(tasks)
+    )
+    # The services keep task_stats and user_task_counters in step with their writes; the bulk
+    # insert below bypasses them, so the aggregates are counted here
+    task_stats = Counter()
+    in_progress_counts = Counter()
+
+    db = SessionLocal()
+    try:
+        clear(db)
+        db.execute(insert(Company), company_rows)
+        db.execute(insert(User), user_rows)
+        batch = []
+        for row in task_rows:
+            task_stats[row["user_id"], row["status"], row["priority"]] += 1
+            if row["status"] == TaskStatus.IN_PROGRESS:
+                in_progress_counts[row["user_id"]] += 1
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.execute(insert(Task), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Task), batch)
+        if task_stats:
+            db.execute(insert(TaskStat), [
+                {"user_id": user_id, "status": status, "priority": priority, "task_count": count}
+                for (user_id, status, priority), count in task_stats.items()
+            ])
+        if in_progress_counts:
+            db.execute(insert(UserTaskCounter), [
+                {"user_id": user_id, "in_progress_count": count} for user_id, count in in_progress_counts.items()
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "company_ids": [row["id"] for row in company_rows],
+        "user_ids": [row["id"] for row in user_rows],
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the local database with benchmark data")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=None, help="defaults to tasks / 20")
+    parser.add_argument("--companies", type=int, default=None, help="defaults to tasks / 1000")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    users = args.users or max(1, args.tasks // 20)
+    companies = args.companies or max(1, args.tasks // 1000)
+    seed(args.tasks, users, companies, args.seed)
+    print(f"Seeded {companies} companies, {users} users, {args.tasks} tasks")
+
+
+if __name__ == "__main__":
+    main()
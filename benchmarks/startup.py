@@ -0,0 +1,82 @@
+""" Application startup benchmark
+
+Usage (from the repository root):
+
+    python -m benchmarks.startup --runs 20 --output bench-startup.json
+    python -m benchmarks.compare bench-startup-old.json bench-startup.json
+
+Every run boots the app in a fresh interpreter, the way a new worker or an
+autoscaled instance does. It reports the process start (interpreter plus site
+packages), the ``app.main`` import and the lifespan startup. No database
+connection is opened, so no database is needed; the DB settings only have to parse.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import percentile, print_results, write_results
+
+CHILD = """
+import asyncio, json, time
+started_at = time.perf_counter()
+from app.main import app
+imported_at = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready_at = asyncio.run(boot())
+print(json.dumps({"import": imported_at - started_at, "lifespan": ready_at - imported_at}))
+"""
+
+
+def boot_once() -> dict:
+    started_at = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - started_at
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process"] = total - timings["import"] - timings["lifespan"]
+    timings["total"] = total
+    return timings
+
+def summarize(name: str, samples: list[float]) -> dict:
+    samples = [sample * 1000 for sample in samples]
+    return {
+        "name": name,
+        "iterations": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p90_ms": round(percentile(samples, 90), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "max_ms": round(max(samples), 4),
+        # Allocations are not tracked across processes
+        "retained_bytes_per_call": 0,
+        "retained_blocks_per_call": 0,
+        "peak_traced_bytes": 0,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure application cold start time")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs to warm the OS file cache")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    for _ in range(args.warmup):
+        boot_once()
+    runs = [boot_once() for _ in range(args.runs)]
+
+    results = [summarize(f"startup.{phase}", [run[phase] for run in runs])
+               for phase in ("process", "import", "lifespan", "total")]
+    print_results(results)
+    write_results(args.output, results, {key: value for key, value in vars(args).items() if key != "output"})
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
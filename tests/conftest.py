@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+
+from app.database import AsyncSessionLocal, dispose_engines, init_async_engine
+
+
+async def database_available() -> bool:
+    init_async_engine()
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+        return True
+    except (exc.DBAPIError, OSError):
+        return False
+    finally:
+        await dispose_engines()
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """Skips the test unless the migrated local database from the DB_* settings is reachable."""
+    if not asyncio.run(database_available()):
+        pytest.skip("local Postgres is not reachable")
@@ -0,0 +1,60 @@
+""" Weak ETags and If-None-Match matching """
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.services.etag import ConditionalRequest, entity_etag, etag_matches, rows_etag
+from app.services.exception import NotModifiedError
+
+UPDATED_AT = datetime(2026, 10, 18, 12, 0, 0)
+
+
+def test_entity_etag_is_weak_and_changes_with_updated_at():
+    entity_id = uuid4()
+    etag = entity_etag(entity_id, UPDATED_AT)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert entity_etag(entity_id, UPDATED_AT) == etag
+    assert entity_etag(entity_id, UPDATED_AT.replace(second=1)) != etag
+
+def test_rows_etag_ignores_row_order():
+    rows = [SimpleNamespace(id=uuid4(), updated_at=UPDATED_AT) for _ in range(3)]
+    assert rows_etag(rows) == rows_etag(rows[::-1])
+
+def test_rows_etag_changes_with_membership_and_updates():
+    rows = [SimpleNamespace(id=uuid4(), updated_at=UPDATED_AT) for _ in range(3)]
+    etag = rows_etag(rows)
+    assert rows_etag(rows[:2]) != etag
+    assert rows_etag([*rows[:2], SimpleNamespace(id=uuid4(), updated_at=UPDATED_AT)]) != etag
+    assert rows_etag([*rows[:2], SimpleNamespace(id=rows[2].id, updated_at=UPDATED_AT.replace(minute=1))]) != etag
+    assert rows_etag([]) == rows_etag([])
+
+@pytest.mark.parametrize("if_none_match", [
+    'W/"abc"',
+    '"abc"',
+    ' W/"abc" ',
+    '"xyz", W/"abc"',
+    'W/"xyz",W/"abc"',
+    '*',
+])
+def test_etag_matches_weakly(if_none_match):
+    assert etag_matches(if_none_match, 'W/"abc"')
+
+@pytest.mark.parametrize("if_none_match", ['W/"abd"', '"ab"', 'abc', '"xyz", "abcd"'])
+def test_etag_does_not_match_other_tags(if_none_match):
+    assert not etag_matches(if_none_match, 'W/"abc"')
+
+def test_conditional_request_raises_not_modified_with_the_etag():
+    conditional = ConditionalRequest('W/"abc"')
+    with pytest.raises(NotModifiedError) as raised:
+        conditional.check('W/"abc"')
+    assert raised.value.headers == {"ETag": 'W/"abc"'}
+
+def test_conditional_request_records_the_etag_when_modified():
+    conditional = ConditionalRequest('W/"old"')
+    conditional.check('W/"new"')
+    assert conditional.etag == 'W/"new"'
+    unconditional = ConditionalRequest(None)
+    unconditional.check('W/"new"')
+    assert unconditional.etag == 'W/"new"'
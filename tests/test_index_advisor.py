@@ -0,0 +1,68 @@
+""" The index advisor's plan checks, against a migrated local database
+
+The database test seeds benchmark data (replacing any earlier ``bench`` rows)
+and checks that the search paths the service benchmarks exercise are served
+by the migrated indexes.
+"""
+import argparse
+import asyncio
+
+from benchmarks.index_advisor import analyze, collapse, covered, recommendation
+from benchmarks.seed import seed
+from app.services.search_cache import search_cache
+
+SEED_TASKS = 20000
+MIN_ROWS = 10000
+
+# (table, text filter, equality filters, order_by) of the paths that have an index
+INDEXED_SHAPES = [
+    ("tasks", None, ("user_id",), None),
+    ("tasks", None, ("status", "user_id"), None),
+    ("tasks", None, ("user_id",), "created_at"),
+    ("tasks", None, (), "created_at"),
+]
+
+
+def test_recommendation_orders_filters_sort_and_id():
+    assert recommendation(("status", "user_id"), "created_at", "cursor") == ("status", "user_id", "created_at", "id")
+    assert recommendation(("status",), "created_at", "offset") == ("status", "created_at")
+    assert recommendation((), None, "cursor") == ()
+
+def test_recommendation_skips_a_sort_on_a_filtered_column():
+    assert recommendation(("priority",), "priority", "cursor") == ("priority", "id")
+
+def test_covered_accepts_equality_columns_in_any_order():
+    indexes = [("user_id", "status", "id"), ("created_at", "id")]
+    assert covered(("status", "user_id", "id"), 2, indexes)
+    assert covered(("status", "user_id"), 2, indexes)
+    assert covered(("created_at",), 0, indexes)
+    assert not covered(("id", "created_at"), 0, indexes)
+    assert not covered(("status", "id"), 1, indexes)
+
+def test_collapse_merges_prefixes_into_the_longest_recommendation():
+    recommended = {
+        ("tasks", ("status",)): ["a"],
+        ("tasks", ("status", "created_at", "id")): ["b"],
+        ("users", ("status",)): ["c"],
+    }
+    assert collapse(recommended) == {
+        ("tasks", ("status", "created_at", "id")): ["a", "b"],
+        ("users", ("status",)): ["c"],
+    }
+
+def test_benchmarked_search_paths_use_indexes(postgres):
+    seed(SEED_TASKS, SEED_TASKS // 20, SEED_TASKS // 1000)
+    max_size = search_cache.max_size
+    try:
+        result = asyncio.run(analyze(argparse.Namespace(analyze=True, min_rows=MIN_ROWS)))
+    finally:
+        search_cache.max_size = max_size
+
+    shapes = {
+        (shape["table"], shape["text"], tuple(shape["filters"]), shape["order_by"], shape["paging"]): shape
+        for shape in result["shapes"]
+    }
+    for table, text_filter, filters, order_by in INDEXED_SHAPES:
+        for paging in ("offset", "cursor"):
+            shape = shapes[table, text_filter, filters, order_by, paging]
+            assert not shape["issues"], shape
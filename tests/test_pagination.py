@@ -0,0 +1,91 @@
+""" Keyset cursor encoding and the conditions that resume a page after the cursor
+
+The conditions are evaluated by SQLite against rows ordered the way Postgres
+orders them: NULLs last for ascending sorts and first for descending ones.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+
+from app.entities import company, task, user  # noqa: F401  (register the mappers)
+from app.entities.task import Task
+from app.services.exception import InvalidInputError
+from app.services.pagination import (
+    _keyset_condition, build_cursor_page, decode_cursor, encode_cursor, parse_cursor,
+)
+
+VALUES = [3, None, 1, 3, None, 2, 1]
+
+
+def test_cursor_round_trip():
+    last_id = uuid4()
+    created_at = datetime(2026, 10, 18, 9, 30, 15, 123456)
+    payload = decode_cursor(encode_cursor("created_at", "desc", created_at, last_id))
+    assert payload == {"o": "created_at", "d": "desc", "v": created_at.isoformat(), "id": last_id}
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor("summary", None, "a?b/c+d", uuid4())
+    assert not set(cursor) & set("+/=")
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30", encode_cursor(None, None, None, uuid4())[:-4]])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidInputError):
+        decode_cursor(cursor)
+
+def test_parse_cursor_loads_the_sort_value():
+    created_at = datetime(2026, 10, 18, 9, 30)
+    payload = parse_cursor(Task, "created_at", "asc", encode_cursor("created_at", "asc", created_at, uuid4()))
+    assert payload["v"] == created_at
+
+def test_parse_cursor_without_cursor_is_the_first_page():
+    assert parse_cursor(Task, "created_at", None, "") is None
+
+@pytest.mark.parametrize("order_by, order_direction", [("summary", "asc"), ("created_at", "desc")])
+def test_parse_cursor_rejects_a_different_sort(order_by, order_direction):
+    cursor = encode_cursor("created_at", "asc", datetime(2026, 10, 18), uuid4())
+    with pytest.raises(InvalidInputError):
+        parse_cursor(Task, order_by, order_direction, cursor)
+
+def test_parse_cursor_rejects_an_unsortable_field():
+    with pytest.raises(InvalidInputError):
+        parse_cursor(Task, "id", None, "")
+
+def test_cursor_page_has_a_next_cursor_only_with_an_extra_row():
+    rows = [SimpleNamespace(id=uuid4(), summary=f"task {index}") for index in range(3)]
+    page = build_cursor_page(rows, "summary", None, 2)
+    assert page["items"] == rows[:2]
+    assert decode_cursor(page["next_cursor"])["id"] == rows[1].id
+    assert build_cursor_page(rows[:2], "summary", None, 2)["next_cursor"] is None
+
+
+@pytest.fixture(scope="module")
+def rows_table():
+    engine = create_engine("sqlite://")
+    table = Table("rows", MetaData(), Column("id", Integer, primary_key=True), Column("value", Integer, nullable=True))
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(table), [{"id": index, "value": value} for index, value in enumerate(VALUES, 1)])
+    yield engine, table
+    engine.dispose()
+
+def postgres_order(rows: list, descending: bool) -> list:
+    ascending = sorted(rows, key=lambda row: (row[1] is None, row[1] or 0, row[0]))
+    return ascending[::-1] if descending else ascending
+
+@pytest.mark.parametrize("nullable", [True, False])
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_condition_resumes_after_every_row(rows_table, nullable, descending):
+    engine, table = rows_table
+    rows = [(index, value) for index, value in enumerate(VALUES, 1) if nullable or value is not None]
+    ordered = postgres_order(rows, descending)
+    with engine.connect() as connection:
+        for position, (last_id, value) in enumerate(ordered):
+            condition = _keyset_condition(table.c.value, table.c.id, nullable, value, last_id, descending)
+            statement = select(table.c.id).where(condition)
+            if not nullable:
+                statement = statement.where(table.c.value.isnot(None))
+            after = set(connection.scalars(statement))
+            assert after == {row_id for row_id, _ in ordered[position + 1:]}, (value, last_id)
@@ -0,0 +1,154 @@
+""" Search result cache: keys, tags, invalidation and stale-while-revalidate """
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.entities import company, task, user  # noqa: F401  (register the mappers)
+from app.entities.task import Task
+from app.services.etag import ConditionalRequest
+from app.services.exception import NotModifiedError
+from app.services.search_cache import SearchResultCache, search_key, search_tags
+
+TTL = 0.05
+
+
+class Loader:
+    """A search that returns one new task per call."""
+
+    def __init__(self, user_id=None) -> None:
+        self.user_id = user_id
+        self.calls = 0
+
+    async def __call__(self, db, conditional: ConditionalRequest):
+        self.calls += 1
+        conditional.etag = f'W/"{self.calls}"'
+        return [Task(id=uuid4(), summary=f"call {self.calls}", user_id=self.user_id)]
+
+
+def new_cache(ttl: float = 60, stale: float = 0, max_rows: int = 100) -> SearchResultCache:
+    return SearchResultCache(max_size=10, max_rows=max_rows, ttl=ttl, stale=stale)
+
+async def get(cache: SearchResultCache, key: tuple, tags: tuple, loader: Loader, conditional=None) -> str:
+    return (await cache.get_or_load(None, Task, key, tags, loader, conditional))[0].summary
+
+
+def test_search_key_ignores_text_case_but_not_filter_values():
+    request = SimpleNamespace(summary="Report", user_id=None, order_by="created_at", order_direction="DESC", page=1)
+    lower = SimpleNamespace(summary="report", user_id=None, order_by="created_at", order_direction="desc", page=1)
+    key = search_key(Task, "admin", request, {"summary": request.summary}, {"user_id": None})
+    assert key == search_key(Task, "admin", lower, {"summary": lower.summary}, {"user_id": None})
+    assert key != search_key(Task, "user-1", lower, {"summary": lower.summary}, {"user_id": None})
+    other_page = SimpleNamespace(**{**vars(lower), "page": 2})
+    assert key != search_key(Task, "admin", other_page, {"summary": "report"}, {"user_id": None})
+
+def test_search_tags_scope_or_wildcard():
+    user_id = uuid4()
+    assert search_tags(Task, {"user_id": user_id, "status": None}, ("user_id",)) == (
+        ("tasks",), ("tasks", "user_id", str(user_id)))
+    assert search_tags(Task, {"user_id": None}, ("user_id",)) == (("tasks",), ("tasks", "*"))
+
+def test_fresh_entry_is_served_without_loading():
+    async def scenario():
+        cache, loader = new_cache(), Loader()
+        tags = search_tags(Task, {}, ())
+        assert await get(cache, ("key",), tags, loader) == "call 1"
+        assert await get(cache, ("key",), tags, loader) == "call 1"
+        assert loader.calls == 1
+        assert cache.stats()["hits"] == 1
+    asyncio.run(scenario())
+
+def test_cached_etag_answers_if_none_match():
+    async def scenario():
+        cache, loader = new_cache(), Loader()
+        tags = search_tags(Task, {}, ())
+        await get(cache, ("key",), tags, loader)
+        with pytest.raises(NotModifiedError):
+            await get(cache, ("key",), tags, loader, ConditionalRequest('W/"1"'))
+    asyncio.run(scenario())
+
+def test_scoped_invalidation_keeps_other_users_entries():
+    async def scenario():
+        cache = new_cache()
+        user_a, user_b = uuid4(), uuid4()
+        loaders = {name: Loader() for name in ("a", "b", "all")}
+        tags = {
+            "a": search_tags(Task, {"user_id": user_a}, ("user_id",)),
+            "b": search_tags(Task, {"user_id": user_b}, ("user_id",)),
+            "all": search_tags(Task, {}, ("user_id",)),
+        }
+        for name in loaders:
+            await get(cache, (name,), tags[name], loaders[name])
+
+        cache.invalidate(Task, {"user_id": {user_a}})
+        for name in loaders:
+            await get(cache, (name,), tags[name], loaders[name])
+        assert {name: loader.calls for name, loader in loaders.items()} == {"a": 2, "b": 1, "all": 2}
+
+        cache.invalidate(Task)
+        await get(cache, ("b",), tags["b"], loaders["b"])
+        assert loaders["b"].calls == 2
+    asyncio.run(scenario())
+
+def test_load_racing_an_invalidation_is_not_cached():
+    async def scenario():
+        cache = new_cache()
+        loader = Loader()
+        tags = search_tags(Task, {}, ())
+
+        async def racing_load(db, conditional):
+            result = await loader(db, conditional)
+            cache.invalidate(Task)
+            return result
+        await cache.get_or_load(None, Task, ("key",), tags, racing_load)
+        assert cache.stats()["skipped_fills"] == 1
+        assert await get(cache, ("key",), tags, loader) == "call 2"
+    asyncio.run(scenario())
+
+def test_large_results_are_not_cached():
+    async def scenario():
+        cache, loader = new_cache(max_rows=0), Loader()
+        tags = search_tags(Task, {}, ())
+        await get(cache, ("key",), tags, loader)
+        await get(cache, ("key",), tags, loader)
+        assert loader.calls == 2
+    asyncio.run(scenario())
+
+def test_stale_entry_is_served_while_one_reload_runs():
+    async def scenario():
+        cache, loader = new_cache(ttl=TTL, stale=60), Loader()
+        tags = search_tags(Task, {}, ())
+        await get(cache, ("key",), tags, loader)
+        await asyncio.sleep(TTL * 1.5)
+
+        # Both requests get the stale result and share one background reload
+        assert await get(cache, ("key",), tags, loader) == "call 1"
+        assert await get(cache, ("key",), tags, loader) == "call 1"
+        await asyncio.gather(*cache._refreshing.values())
+        assert loader.calls == 2
+        assert await get(cache, ("key",), tags, loader) == "call 2"
+        assert cache.stats()["stale_hits"] == 2
+        assert cache.stats()["refreshes"] == 1
+    asyncio.run(scenario())
+
+def test_entry_past_the_stale_window_is_reloaded_inline():
+    async def scenario():
+        cache, loader = new_cache(ttl=TTL, stale=0), Loader()
+        tags = search_tags(Task, {}, ())
+        await get(cache, ("key",), tags, loader)
+        await asyncio.sleep(TTL * 1.5)
+        assert await get(cache, ("key",), tags, loader) == "call 2"
+        assert cache.stats()["misses"] == 2
+    asyncio.run(scenario())
+
+def test_invalidated_entry_is_never_served_stale():
+    async def scenario():
+        cache, loader = new_cache(ttl=TTL, stale=60), Loader()
+        tags = search_tags(Task, {}, ())
+        await get(cache, ("key",), tags, loader)
+        await asyncio.sleep(TTL * 1.5)
+        cache.invalidate(Task)
+        assert await get(cache, ("key",), tags, loader) == "call 2"
+        assert cache.stats()["stale_hits"] == 0
+    asyncio.run(scenario())
@@ -0,0 +1,109 @@
+""" The LRU/TTL cache and the verified-claims cache of LocalAuthorizer """
+import hashlib
+import time
+
+import jwt
+import pytest
+
+from app.services import cache
+from app.services.auth import LocalAuthorizer
+from app.services.cache import LRUCache
+from app.services.exception import UnAuthorizedError
+from app.settings import JWT_ALGORITHM, JWT_SECRET
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the cache's view of time moves; token verification keeps the real clock
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+def token(exp: float) -> str:
+    claims = {"sub": "user-1", "username": "user", "email": "user@example.com", "is_admin": False, "is_active": True,
+              "aud": "FastAPI", "iss": "FastAPI", "iat": int(time.time()), "exp": int(exp)}
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+def test_lru_entry_expires_at_its_expiry(clock):
+    lru = LRUCache(10)
+    lru.set("a", 1, expires_at=clock.now + 5)
+    clock.now += 4.9
+    assert lru.get("a") == 1
+    clock.now += 0.1
+    assert lru.get("a", "missing") == "missing"
+    assert lru.stats()["size"] == 0
+
+def test_lru_ttl_caps_a_later_expiry(clock):
+    lru = LRUCache(10, ttl=10)
+    lru.set("short", 1, expires_at=clock.now + 5)
+    lru.set("long", 2, expires_at=clock.now + 60)
+    lru.set("none", 3)
+    clock.now += 6
+    assert lru.get("short") is None
+    assert (lru.get("long"), lru.get("none")) == (2, 3)
+    clock.now += 4
+    assert (lru.get("long"), lru.get("none")) == (None, None)
+
+def test_lru_of_size_zero_stores_nothing():
+    lru = LRUCache(0)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+
+def test_lru_stats_count_hits_and_misses():
+    lru = LRUCache(10)
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("b")
+    assert lru.stats() == {"size": 1, "max_size": 10, "hits": 1, "misses": 1, "evictions": 0, "hit_ratio": 0.5}
+
+
+def test_authorizer_serves_repeated_tokens_from_the_cache(clock):
+    authorizer = LocalAuthorizer(cache_size=10, cache_ttl=300)
+    access_token = token(time.time() + 60)
+    claims = authorizer.authorize(access_token)
+    assert authorizer.authorize(access_token) is claims
+    assert authorizer.token_cache.stats()["hits"] == 1
+
+def test_cached_claims_expire_at_the_token_exp(clock):
+    authorizer = LocalAuthorizer(cache_size=10, cache_ttl=300)
+    exp = int(time.time()) + 60
+    access_token = token(exp)
+    authorizer.authorize(access_token)
+    token_hash = hashlib.sha256(access_token.encode()).digest()
+    clock.now = exp - 1
+    assert authorizer.token_cache.get(token_hash) is not None
+    clock.now = exp
+    assert authorizer.token_cache.get(token_hash) is None
+
+def test_cached_claims_expire_after_the_cache_ttl(clock):
+    authorizer = LocalAuthorizer(cache_size=10, cache_ttl=30)
+    access_token = token(time.time() + 3600)
+    authorizer.authorize(access_token)
+    token_hash = hashlib.sha256(access_token.encode()).digest()
+    clock.now += 30
+    assert authorizer.token_cache.get(token_hash) is None
+
+def test_expired_token_is_rejected_and_not_cached():
+    authorizer = LocalAuthorizer(cache_size=10, cache_ttl=300)
+    with pytest.raises(UnAuthorizedError):
+        authorizer.authorize(token(time.time() - 60))
+    assert authorizer.token_cache.stats()["size"] == 0
@@ -0,0 +1,80 @@
+""" Create and update endpoints through the async session, against a migrated local database
+
+Usage (from the repository root, with the DB_* settings of a local Postgres):
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import text
+
+import httpx
+
+from app.database import AsyncSessionLocal, dispose_engines, init_async_engine
+from app.entities.user import User
+from app.main import app
+from app.services.user import create_access_token
+
+
+async def cleanup(company_id, user_id) -> None:
+    async with AsyncSessionLocal() as db:
+        params = {"company_id": company_id, "user_id": user_id}
+        await db.execute(text("DELETE FROM tasks WHERE user_id = :user_id"), params)
+        await db.execute(text("DELETE FROM task_stats WHERE user_id = :user_id"), params)
+        await db.execute(text("DELETE FROM user_task_counters WHERE user_id = :user_id"), params)
+        await db.execute(text("DELETE FROM users WHERE id = :user_id"), params)
+        await db.execute(text("DELETE FROM companies WHERE id = :company_id"), params)
+        await db.commit()
+
+async def create_and_update() -> None:
+    # ASGITransport does not run the lifespan
+    init_async_engine()
+    admin = User(id=uuid4(), username="test_admin", email="test_admin@example.com", is_admin=True, is_active=True)
+    headers = {"Authorization": f"Bearer {create_access_token(admin)}"}
+    suffix = uuid4().hex[:12]
+    company_id = user_id = None
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/company/", headers=headers,
+                                         json={"name": f"test company {suffix}", "description": "created by tests"})
+            assert response.status_code == 200, response.text
+            company_id = response.json()["id"]
+
+            response = await client.put(f"/company/{company_id}", headers=headers,
+                                        json={"name": f"test company {suffix}", "description": "updated by tests"})
+            assert response.status_code == 200, response.text
+            assert response.json()["description"] == "updated by tests"
+
+            response = await client.post("/user/", headers=headers, json={
+                "username": f"test_{suffix}", "password": "test-password", "first_name": "Test", "last_name": "User",
+                "email": f"test_{suffix}@example.com", "company_id": company_id,
+            })
+            assert response.status_code == 200, response.text
+            user_id = response.json()["id"]
+
+            response = await client.post("/task/", headers=headers, json={
+                "summary": "test task", "description": "created by tests", "user_id": user_id,
+            })
+            assert response.status_code == 200, response.text
+            task_id = response.json()["id"]
+
+            response = await client.put(f"/task/{task_id}", headers=headers, json={
+                "summary": "test task", "description": "updated by tests", "user_id": user_id, "status": 2,
+            })
+            assert response.status_code == 200, response.text
+            assert response.json()["status"] == 2
+
+            # Rows loaded by asyncpg go through the default response serialization
+            response = await client.get(f"/task/{task_id}", headers=headers)
+            assert response.status_code == 200, response.text
+            assert response.json()["id"] == task_id
+    finally:
+        if company_id:
+            await cleanup(company_id, user_id)
+        await dispose_engines()
+
+
+def test_create_and_update_endpoints(postgres):
+    asyncio.run(create_and_update())